@@ -1,21 +1,40 @@
-import json
 import asyncio
 import logging
+import socket
 import websockets
-from typing import Callable
+from typing import Callable, Dict, List
 from websockets.asyncio.client import connect
+from websockets.protocol import State
 from lobsim.config import NetworkConfig
+from lobsim.utils import _noop
 from lobsim.utils import build_message
+from lobsim.utils import build_order
+from lobsim.utils import loads
+from lobsim.utils import msgpack
+from lobsim.utils import pack_message
+from lobsim.utils import pack_order
+from lobsim.utils import unpack_message
+from lobsim.utils import MSGPACK_SUBPROTOCOL
 
 logger = logging.getLogger(__name__)
 
+TRADING = "trading"
+QUOTES = "quotes"
+TRADES = "trades"
+LOBVIZ = "lobviz"
+
 
 class WebsocketClient:
 
-    AVAILABLE_PRIVATE_TOPICS = ("trading",)
-    AVAILABLE_PUBLIC_TOPICS = ("quotes", "trades", "lobviz")
+    AVAILABLE_PRIVATE_TOPICS = (TRADING,)
+    AVAILABLE_PUBLIC_TOPICS = (QUOTES, TRADES, LOBVIZ)
 
-    def __init__(self, on_trade: Callable = print):
+    def __init__(
+        self,
+        on_trade: Callable = print,
+        binary: bool = False,
+        nodelay: bool = True,
+    ):
         host = NetworkConfig.host
         port = NetworkConfig.port
         uri = f"ws://{host}:{port}"
@@ -23,6 +42,34 @@ class WebsocketClient:
         self._private_uri = f"{uri}/private"
         self._client_id = None
         self.tasks = {}
+        # callbacks of the multiplexed public topics, keyed by the event of
+        # their messages
+        self._handlers: Dict[str, Callable] = {}
+        # current callback of each subscription task, keyed by the joined
+        # topics of its connection and read on every frame
+        self._sinks: Dict[str, Callable] = {}
+        # topics sharing the connection of each subscribed topic
+        self._groups: Dict[str, List[str]] = {}
+        # connection kept open to place orders
+        self._order_ws = None
+        self._order_lock = asyncio.Lock()
+        # reads the replies of the server on the order connection
+        self._order_reader = None
+        # small frames are pushed and acknowledged without delay
+        self._nodelay = nodelay
+        # the server exchanges msgpack frames when started with binary=True
+        if binary:
+            if msgpack is None:
+                raise ImportError("msgpack is required for binary feeds")
+            self._subprotocols = [MSGPACK_SUBPROTOCOL]
+            self._build_message = pack_message
+            self._build_order = pack_order
+            self._loads = unpack_message
+        else:
+            self._subprotocols = None
+            self._build_message = build_message
+            self._build_order = build_order
+            self._loads = loads
 
     async def unsubscribe(self, topic):
         """Cancels any running task of a given `topic`
@@ -37,7 +84,8 @@ class WebsocketClient:
             - lobviz
             - quotes
         """
-        logger.debug(f"Cancelling {topic=}")
+        logger.debug("Cancelling topic=%r", topic)
+        self._handlers.pop(topic, None)
         self.tasks[topic].cancel()
         while not self.tasks[topic].cancelled():
             await asyncio.sleep(0)
@@ -52,54 +100,215 @@ class WebsocketClient:
         if topic in t and not (t[topic].done() or t[topic].cancelled()):
             logger.warning(f"Already subscribed. check {t[topic]}")
         else:
-            logger.info(f"Subscribing to {topic=}")
-            if topic == "trading":
+            logger.info("Subscribing to topic=%r", topic)
+            self._sinks[topic] = callback or _noop
+            self._groups[topic] = [topic]
+            if topic == TRADING:
                 t[topic] = asyncio.create_task(
-                    self._subscribe_private(callback), name=f"{topic}_task"
+                    self._subscribe_private(topic), name=f"{topic}_task"
                 )
             else:
                 t[topic] = asyncio.create_task(
-                    self._subscribe_impl(topic, callback), name=f"{topic}_task"
+                    self._subscribe_impl([topic], topic),
+                    name=f"{topic}_task",
                 )
             await asyncio.sleep(0)
 
-    async def place_order(self, **kwargs):
+    async def subscribe_many(self, mapping: Dict[str, Callable]):
+        """Subscribes to several topics at once.
+
+        The public topics share a single connection and are requested with
+        one subscription message. Unsubscribing from any of them closes
+        that connection and therefore ends all the others.
+
+        Parameters
+        ----------
+
+        mapping: Dict[str, Callable]
+            The callback to call for each topic. The messages of a topic
+            with None as callback are dropped.
+        """
+        t = self.tasks
+        topics = []
+        for topic, callback in mapping.items():
+            if topic in t and not (t[topic].done() or t[topic].cancelled()):
+                logger.warning(f"Already subscribed. check {t[topic]}")
+            elif topic in self.AVAILABLE_PRIVATE_TOPICS:
+                await self.subscribe(topic, callback)
+            else:
+                assert topic in self.AVAILABLE_PUBLIC_TOPICS
+                self._handlers[topic] = callback or _noop
+                topics.append(topic)
+        if not topics:
+            return
+
+        key = "_".join(topics)
+        logger.info("Subscribing to topics=%r", topics)
+        task = asyncio.create_task(
+            self._subscribe_impl(topics, key), name=f"{key}_task"
+        )
+        for topic in topics:
+            t[topic] = task
+            self._groups[topic] = topics
+        self._update_route(topics)
+        await asyncio.sleep(0)
+
+    def set_callback(self, topic: str, callback: Callable):
+        """Replaces the callback of a subscribed `topic` without
+        reconnecting. The messages are not decoded while no subscribed
+        topic of the connection has a callback.
+        """
+        callback = callback or _noop
+        topics = self._groups[topic]
+        if len(topics) == 1:
+            self._sinks[topic] = callback
+        else:
+            self._handlers[topic] = callback
+            self._update_route(topics)
+
+    def _update_route(self, topics: List[str]):
+        route = self._route
+        if all(self._handlers.get(t, _noop) is _noop for t in topics):
+            route = _noop
+        self._sinks["_".join(topics)] = route
+
+    async def place_order(self, order_type: str, **kwargs):
+        self._check_trading()
+        kwargs["client_id"] = self._client_id
+        await self._send(self._build_order(order_type, **kwargs))
+
+    async def place_orders(self, orders: List[Dict]):
+        """Sends several orders, given as `place_order` keyword arguments,
+        in a single message.
+        """
+        self._check_trading()
+        for kwargs in orders:
+            kwargs["client_id"] = self._client_id
+        await self._send(self._build_message("trade", params=orders))
+
+    def _check_trading(self):
         if self._client_id is None:
             raise ValueError(
                 "Cannot place orders. You need to subscribe to trading."
             )
-        kwargs["client_id"] = self._client_id
-        message = build_message("trade", params=kwargs)
-        logger.info(f"Sending trade {message=}")
-        async with connect(self._private_uri) as ws:
-            await ws.send(message)
-
-    async def _subscribe_impl(self, topic, callback):
-        callback = callback or print
-        async for websocket in connect(self._public_uri):
-            logger.debug(f"Connected to {self._public_uri} for {topic=}")
+
+    async def warmup(self):
+        """Opens the connection used to place orders, if it is not open
+        already, so that the first order does not wait for the handshake.
+        """
+        async with self._order_lock:
+            ws = self._order_ws
+            if ws is None or ws.state is not State.OPEN:
+                self._order_ws = await self._connect(self._private_uri)
+                self._tune_socket(self._order_ws)
+                self._stop_order_reader()
+                self._order_reader = asyncio.create_task(
+                    self._read_orders(self._order_ws), name="order_reader"
+                )
+                logger.debug("Opened the order connection")
+
+    async def close(self):
+        """Closes the connection used to place orders"""
+        self._stop_order_reader()
+        if self._order_ws is not None:
+            await self._order_ws.close()
+            self._order_ws = None
+
+    def _stop_order_reader(self):
+        if self._order_reader is not None:
+            self._order_reader.cancel()
+            self._order_reader = None
+
+    async def _read_orders(self, websocket):
+        # the server answers rejected requests on the order connection.
+        # Unread frames would fill the receive queue, after which the
+        # keepalive pings are no longer answered and the connection is
+        # dropped without `_send` noticing.
+        try:
+            async for message in websocket:
+                message = self._loads(message)
+                if message.get("event") == "error":
+                    logger.error("Order rejected: %s", message["message"])
+                else:
+                    logger.debug("Received message=%r", message)
+        except websockets.ConnectionClosed:
+            logger.warning("Order connection closed by the server")
+
+    async def _send(self, message):
+        logger.info("Sending trade message=%r", message)
+        await self.warmup()
+        try:
+            await self._order_ws.send(message)
+        except websockets.ConnectionClosed:
+            logger.warning("Order connection lost, reconnecting")
+            await self.warmup()
+            await self._order_ws.send(message)
+
+    @staticmethod
+    def _dispatch(message, callback):
+        # messages published together by the server are merged into
+        # a single array
+        if isinstance(message, list):
+            for item in message:
+                callback(item)
+        else:
+            callback(message)
+
+    async def _receive(self, websocket, key: str):
+        sinks = self._sinks
+        while True:
+            message = await websocket.recv()
+            callback = sinks[key]
+            # without a callback the messages are not even decoded
+            if callback is not _noop:
+                self._dispatch(self._loads(message), callback)
+
+    def _route(self, message):
+        handler = self._handlers.get(message["event"])
+        if handler is None:
+            logger.warning(f"No callback for message {message}")
+        else:
+            handler(message)
+
+    def _connect(self, uri):
+        return connect(uri, subprotocols=self._subprotocols)
+
+    def _tune_socket(self, websocket):
+        sock = websocket.transport.get_extra_info("socket")
+        if sock is None or not self._nodelay:
+            return
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # Linux only, the kernel may turn it off again after a while
+        if hasattr(socket, "TCP_QUICKACK"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+
+    async def _subscribe_impl(self, topics: List[str], key: str):
+        if len(topics) == 1:
+            request = self._build_message(event=topics[0])
+        else:
+            request = self._build_message(event="subscribe", topics=topics)
+        async for websocket in self._connect(self._public_uri):
+            logger.debug(
+                "Connected to %s for topics=%r", self._public_uri, topics
+            )
+            self._tune_socket(websocket)
             try:
-                logger.debug(f"Creating new websocket {websocket.id!s}")
-                message = build_message(event=topic)
-                await websocket.send(message)
-                while True:
-                    message = json.loads(await websocket.recv())
-                    callback(message)
+                logger.debug("Creating new websocket %s", websocket.id)
+                await websocket.send(request)
+                await self._receive(websocket, key)
             except websockets.ConnectionClosed:
                 logger.warning("Public connection lost. Server disconnected")
             except Exception as e:
                 raise e
 
-    async def _subscribe_private(self, callback):
-        async for websocket in connect(self._private_uri):
-            logger.debug(f"Connected to URI: {self._private_uri}")
+    async def _subscribe_private(self, key: str):
+        async for websocket in self._connect(self._private_uri):
+            logger.debug("Connected to URI: %s", self._private_uri)
+            self._tune_socket(websocket)
             try:
-                init_message = build_message(event="init")
+                init_message = self._build_message(event="init")
                 await websocket.send(init_message)
                 self._client_id = await websocket.recv()
-                while True:
-                    message = json.loads(await websocket.recv())
-                    logger.debug(f"Received {message=}")
-                    callback(message)
+                await self._receive(websocket, key)
             except websockets.ConnectionClosed:
                 logger.warning("Private connection lost. Server disconnected")
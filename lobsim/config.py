@@ -5,6 +5,10 @@ from dataclasses import dataclass
 class NetworkConfig:
     host: str = "localhost"
     port: int = 9876
+    # kernel send buffer of the accepted sockets, in bytes
+    send_buffer: int = 2**20
+    # bytes buffered by websockets before a send waits for the socket
+    write_limit: int = 2**20
 
 
 @dataclass
@@ -22,3 +26,9 @@ class OrderbookConfig:
 class ExchangeConfig:
     trades_freq: float = 0.01
     quotes_freq: float = 0.01
+    # number of limits per side sent in quotes, None for the whole book
+    quotes_depth: int = None
+    # unchanged quotes are only sent again every `snapshot_freq` seconds
+    snapshot_freq: float = 1.0
+    # msgpack encoded feeds, clients need the msgpack.v1 subprotocol
+    binary: bool = False
@@ -2,21 +2,21 @@ from dataclasses import dataclass
 from lobsim.utils import is_divisible
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class LotSize:
     max_qty: float
     min_qty: float
     step_size: float
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class PriceDetails:
     tick_size: float
     min_price: float
     max_price: float
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Precision:
     price_precision: int
     quote_precision: int
@@ -24,20 +24,20 @@ class Precision:
     base_asset_precision: int
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class MarginDetails:
     margin_pct: float
     m_margin_pct: float
     margin_asset: str
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Fees:
     liquidation_fee: float
     taking_fee: float
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Instrument:
     symbol: str
     contract_type: str
@@ -72,6 +72,14 @@ class Instrument:
 
         return True
 
+    def to_ticks(self, price: float) -> int:
+        """Converts a `price` to its number of ticks on the price grid"""
+        return round(price / self.price_details.tick_size)
+
+    def from_ticks(self, ticks: int) -> float:
+        """Converts a number of `ticks` back to a price"""
+        return self.adjust_price(ticks * self.price_details.tick_size)
+
     def adjust_price(self, price):
         return round(price, self.precision.price_precision)
 
@@ -1,11 +1,11 @@
 import logging
+from bisect import bisect_left
+from bisect import insort
 from typing import Dict
 from typing import Callable
 from typing import List
 from termcolor import colored
 from lobsim.utils import now
-from lobsim.utils import is_divisible
-from lobsim.utils import exist_any
 from lobsim.queue import Queue
 from lobsim.orders import Side
 from lobsim.orders import Order
@@ -18,70 +18,121 @@ logger = logging.getLogger(__name__)
 
 class Orderbook:
 
+    # Maximum number of empty limits rendered between two queues
+    MAX_EMPTY_ROWS = 10
+
+    __slots__ = (
+        "max_ask",
+        "min_bid",
+        "_best_bid",
+        "_best_ask",
+        "_bid_volume",
+        "_ask_volume",
+        "version",
+        "queues",
+        "_ticks",
+        "order_map",
+        "_prev_mid",
+        "_curr_mid",
+        "_instrument",
+        "_tick_size",
+        "_half_tick",
+        "_price_prec",
+        "_qty_prec",
+        "send_private",
+    )
+
     def __init__(self, instrument: Instrument, send_private: Callable = None):
         self.max_ask: float = 0.0
         self.min_bid: float = float("inf")
-        self.best_queue: Dict[Side, Queue] = {Side.BID: None, Side.ASK: None}
-        self.best_volumes: Dict[Side, float] = {Side.BID: 0, Side.ASK: 0}
-        self.queues: Dict[float, Queue] = {}
-        self.order_map: Dict[str, Order] = {}
+        self._best_bid: Queue = None
+        self._best_ask: Queue = None
+        self._bid_volume: float = 0
+        self._ask_volume: float = 0
+        # incremented whenever the volume of the book changes
+        self.version: int = 0
+        # Queues keyed by their limit as a number of ticks
+        self.queues: Dict[int, Queue] = {}
+        # Sorted tick limits of the existing queues (both sides)
+        self._ticks: List[int] = []
+        self.order_map: Dict[int, Order] = {}
+        # mid prices expressed in half ticks
         self._prev_mid = None
         self._curr_mid = None
         self._instrument = instrument
+        self._tick_size = instrument.price_details.tick_size
+        self._half_tick = 0.5 * self._tick_size
+        self._price_prec = instrument.precision.price_precision
+        self._qty_prec = instrument.precision.quantity_precision
         self.send_private = send_private
 
+    def reset(self):
+        """Removes all the orders and queues of the orderbook.
+
+        The instrument and the `send_private` callback are kept, and the
+        containers are cleared in place rather than reallocated.
+        """
+        self.max_ask = 0.0
+        self.min_bid = float("inf")
+        self._best_bid = None
+        self._best_ask = None
+        self._bid_volume = 0
+        self._ask_volume = 0
+        self.version += 1
+        self.queues.clear()
+        self._ticks.clear()
+        self.order_map.clear()
+        self._prev_mid = None
+        self._curr_mid = None
+
     @property
     def tick_size(self):
-        return self._instrument.price_details.tick_size
+        return self._tick_size
+
+    @property
+    def best_queue(self) -> Dict[Side, Queue]:
+        """The best queue of each side, None when the side is empty"""
+        return {Side.BID: self._best_bid, Side.ASK: self._best_ask}
+
+    @property
+    def best_volumes(self) -> Dict[Side, float]:
+        """The total volume resting on each side"""
+        return {Side.BID: self._bid_volume, Side.ASK: self._ask_volume}
 
     @property
     def mid_price(self) -> float:
-        return self._curr_mid
+        if self._curr_mid is None:
+            return None
+        return round(self._curr_mid * self._half_tick, self._price_prec)
 
     def _update_mid(self):
-        best_ask_q = self.best_queue[Side.ASK]
-        best_bid_q = self.best_queue[Side.BID]
-        if not exist_any(best_ask_q, best_bid_q):
+        best_ask_q = self._best_ask
+        best_bid_q = self._best_bid
+        if best_ask_q is None and best_bid_q is None:
             self._prev_mid = None
             self._curr_mid = None
             return
 
         if best_ask_q is None:
-            self._curr_mid = self._instrument.adjust_price(
-                best_bid_q.limit + 0.5 * self.tick_size
-            )
-            return
-
-        if best_bid_q is None:
-            self._curr_mid = self._instrument.adjust_price(
-                best_ask_q.limit - 0.5 * self.tick_size
-            )
-            return
-
-        self._prev_mid = self._curr_mid
-
-        best_ask = best_ask_q.limit
-        best_bid = best_bid_q.limit
-        self._curr_mid = self._instrument.adjust_price(
-            0.5 * (best_ask + best_bid)
-        )
+            self._curr_mid = 2 * best_bid_q.limit_ticks + 1
+        elif best_bid_q is None:
+            self._curr_mid = 2 * best_ask_q.limit_ticks - 1
+        else:
+            prev_mid = self._curr_mid
+            mid = best_ask_q.limit_ticks + best_bid_q.limit_ticks
 
-        # Check if the mid price is in the tick grid
-        # If it is the case add/substract a half tick
-        # whichever the closest to the previous mid
-        half_tick = 0.5 * self.tick_size
-
-        if is_divisible(self._curr_mid, self.tick_size):
-            if self._curr_mid < self._prev_mid:
-                self._curr_mid += half_tick
-            else:
-                self._curr_mid -= half_tick
-        self._curr_mid = self._instrument.adjust_price(self._curr_mid)
+            # If the mid price is in the tick grid (even number of half
+            # ticks) add/substract a half tick, whichever the closest to
+            # the previous mid
+            on_grid = 1 - (mid & 1)
+            direction = 2 * (mid < prev_mid) - 1
+            self._prev_mid = prev_mid
+            self._curr_mid = mid + on_grid * direction
 
     def depth(self, side) -> int:
         """Computes the depth of one side of the orderbook"""
         m = self.min_bid if side.is_bid else self.max_ask
-        return side * (self.best_queue[side].limit - m) // self.tick_size
+        return side * (self._best(side).limit - m) // self._tick_size
 
     def init_state(self, unit_size: float, bid_state: List, ask_state: List):
         """Initialize the orderbook state.
@@ -112,38 +163,45 @@ class Orderbook:
             in each price limit.
             The number of orders is then deduced as volume // unit_size
         """
-        owner = "system"
         logger.debug("Initializing the LOB state")
-        # Update the bid side of the orderbook
-        for price, volume in bid_state:
-            for _ in range(volume // unit_size):
-                order = Order(
-                    instrument=self._instrument,
-                    owner=owner,
-                    side=Side.BID,
-                    quantity=unit_size,
-                    price=price,
-                )
-                self.order_map[order.order_id] = order
-                self._insert_order(order)
+        self._init_side(Side.BID, unit_size, bid_state)
+        self._init_side(Side.ASK, unit_size, ask_state)
 
-        # Update the ask side of the orderbook
-        for price, volume in ask_state:
-            for _ in range(volume // unit_size):
-                order = Order(
+    def _init_side(self, side: Side, unit_size: float, state: List):
+        owner = "system"
+        for price, volume in state:
+            n = int(volume // unit_size)
+            if n == 0:
+                continue
+            queue = self.queues.get(self._instrument.to_ticks(price))
+            if queue is None:
+                queue = self._create_queue(side, price)
+            orders = [
+                Order(
                     instrument=self._instrument,
                     owner=owner,
-                    side=Side.ASK,
+                    side=side,
                     quantity=unit_size,
                     price=price,
                 )
-                self.order_map[order.order_id] = order
-                self._insert_order(order)
+                for _ in range(n)
+            ]
+            self.order_map.update((order.order_id, order) for order in orders)
+            queue.extend(orders)
+            self._add_volume(side, n * unit_size)
 
-    def get_state(self):
+    def get_state(self, depth: int = None):
         """Returns the state of the orderbook as a dictionnary
         containing the bid and ask limits and their volumes
 
+        Parameters
+        ----------
+
+        depth: int, default=None
+            The number of limits to report on each side, counted from the
+            best limit. Only the first `depth` queues of each side are
+            visited. All the limits are reported when None.
+
         Returns:
         --------
 
@@ -154,15 +212,19 @@ class Orderbook:
         """
         bids = []
         asks = []
-        qb = self.best_queue[Side.BID]
-        qa = self.best_queue[Side.ASK]
-        while exist_any(qb, qa):
+        qb = self._best_bid
+        qa = self._best_ask
+        level = 0
+        if depth is None:
+            depth = len(self.queues)
+        while (qb is not None or qa is not None) and level < depth:
             if qb is not None:
                 bids.append((qb.limit, qb.volume))
                 qb = qb.qnext
             if qa is not None:
                 asks.append((qa.limit, qa.volume))
                 qa = qa.qnext
+            level += 1
         return dict(ts=now(), b=bids, a=asks)
 
     def on_limit(
@@ -192,7 +254,7 @@ class Orderbook:
         client_id: str
            The identity of the client sending the order.
         """
-        best_queue = self.best_queue[-side]
+        best_queue = self._best(-side)
         if best_queue is not None and price * side >= best_queue.limit * side:
             logger.warning(
                 "Crossing the spread, sending a marketable order instead."
@@ -232,8 +294,11 @@ class Orderbook:
            The identity of the client sending the order.
         """
 
+        opp = -side
+        qty_prec = self._qty_prec
+
         # walk the best limit
-        q = self.best_queue[-side]
+        q = self._best(opp)
         if q is None:
             return self._reject_market(
                 client_id, side=str(side), quantity=quantity, price=price
@@ -241,21 +306,17 @@ class Orderbook:
 
         # Walk the orderbook up to the limit = price
         # while we still have liquidity to be consumed
-        while quantity != 0 and side * q.limit <= side * price:
-            order = q.ohead
-            qty = min(quantity, order.remaining)
-            q.fill(order, qty)
-            self.best_volumes[order.side] = self._instrument.adjust_quantity(
-                self.best_volumes[order.side] - qty
-            )
-            if order.filled:
-                q.remove(order)
-                self.order_map[order.order_id]
-
-            quantity = self._instrument.adjust_quantity(quantity - qty)
-            if q.empty:
-                self._delete_queue(-side, q)
-            q = self.best_queue[-side]
+        sign = side.value
+        signed_price = sign * price
+        while quantity != 0 and sign * q.limit <= signed_price:
+            filled = self._sweep_queue(q, quantity)
+            self._add_volume(opp, -filled)
+            quantity = round(quantity - filled, qty_prec)
+            if not q.empty:
+                break
+            # The next queue becomes the best one once `q` is deleted
+            self._delete_queue(opp, q)
+            q = q.qnext
             if q is None:
                 break
 
@@ -288,7 +349,7 @@ class Orderbook:
         client_id: str
            The identity of the client sending the order.
         """
-        available = self.best_volumes[side]
+        available = self._volume(side)
         if quantity > available:
             self._reject_market(
                 client_id=client_id,
@@ -298,70 +359,68 @@ class Orderbook:
             )
             return
 
+        qty_prec = self._qty_prec
         remaining = quantity
-        while remaining != 0:
-            q = self.best_queue[side]
-            if q is None:
-                self._reject_market(
-                    client_id, side=str(side), quantity=quantity
-                )
-                return
-
+        q = self._best(side)
+        while remaining != 0 and q is not None:
             logger.debug(
-                f"Executing {side=!s}, {remaining=}. Best queue is {q!r}"
-            )
-            order = q.ohead
-            qty = min(remaining, order.remaining)
-            q.fill(order, qty)
-            self.best_volumes[order.side] = self._instrument.adjust_quantity(
-                self.best_volumes[order.side] - qty
+                "Executing side=%s, remaining=%s. Best queue is %r",
+                side,
+                remaining,
+                q,
             )
-            logger.debug(f"Updated: {q!r}")
-            if order.filled:
-                q.remove(order)
-                del self.order_map[order.order_id]
-            logger.debug(f"Checking the {q!r}")
+            filled = self._sweep_queue(q, remaining)
+            logger.debug("Updated: %r", q)
             if q.empty:
                 self._delete_queue(side, q)
-            remaining = self._instrument.adjust_quantity(remaining - qty)
+                q = q.qnext
+            remaining = round(remaining - filled, qty_prec)
+
+        # the side volume is updated once for the whole sweep
+        self._add_volume(side, round(remaining - quantity, qty_prec))
+        if remaining != 0:
+            self._reject_market(client_id, side=str(side), quantity=quantity)
+            return
         logger.info(
-            f"Market order executed {client_id=}, {side=!s}, {quantity=},"
-            f" {remaining=}"
+            "Market order executed client_id=%r, side=%s, quantity=%s,"
+            " remaining=%s",
+            client_id,
+            side,
+            quantity,
+            remaining,
         )
 
-    def on_cancel(self, order_id: str):
+    def on_cancel(self, order_id: int):
         """Cancels an order
 
         Parameters
         ----------
 
-        order_id: str
+        order_id: int
             The ID of the order to be canceled
         """
         order = self._get_order(order_id)
         queue = order.queue
 
-        logger.debug(f"Order {order} is being cancelled")
+        logger.debug("Order %s is being cancelled", order)
         message = dict(status="Cancelled")
         message.update(order.infos())
 
         client_id = order.owner
         queue.remove(order)
-        self.best_volumes[order.side] = self._instrument.adjust_quantity(
-            self.best_volumes[order.side] - order.quantity
-        )
+        self._add_volume(order.side, -order.quantity)
         if queue.empty:
             self._delete_queue(order.side, queue)
         del self.order_map[order.order_id]
         self.send_private(client_id, message)
 
-    def on_amend(self, order_id: str, quantity: float, price: float):
+    def on_amend(self, order_id: int, quantity: float, price: float):
         """Modify an already existing order in the orderbook
 
         Parameters
         ----------
 
-        order_id: str
+        order_id: int
             The ID of the order to be ameneded
 
         quantity: float
@@ -381,13 +440,12 @@ class Orderbook:
         queue = order.queue
         queue.remove(order)
 
-        self.best_volumes[order.side] = self._instrument.adjust_quantity(
-            self.best_volumes[order.side] - order.quantity
-        )
+        self._add_volume(order.side, -order.quantity)
 
-        if queue.empty and queue.limit != price:
-            logger.info(f"Deleting {queue=!r}")
-            del self.queues[queue.limit]
+        ticks = self._instrument.to_ticks(price)
+        if queue.empty and queue.limit_ticks != ticks:
+            logger.info("Deleting queue=%r", queue)
+            self._remove_queue(queue)
 
         # The case of marketable limit orders
         if side * price >= self.mid_price * side:
@@ -398,11 +456,11 @@ class Orderbook:
             return
 
         # We update the orders' Q if different
-        if queue.limit != price:
-            logger.debug(f"Finding queue with {price=}")
-            if price in self.queues:
+        if queue.limit_ticks != ticks:
+            logger.debug("Finding queue with price=%s", price)
+            if ticks in self.queues:
                 logger.debug("Queue exists")
-                new_queue = self.queues[price]
+                new_queue = self.queues[ticks]
             else:
                 logger.debug("Creating a new queue")
                 new_queue = self._create_queue(side, price)
@@ -411,101 +469,137 @@ class Orderbook:
 
         order.update(price=price, quantity=quantity)
         new_queue.add(order)
-        self.best_volumes[order.side] = self._instrument.adjust_quantity(
-            self.best_volumes[order.side] + quantity
-        )
-        logger.info(f"Amended {order=!s}")
+        self._add_volume(order.side, quantity)
+        logger.info("Amended order=%s", order)
         message = dict(status="Amended")
         message.update(order.infos())
         self.send_private(order.owner, message)
 
     def _create_queue(self, side: Side, price: float) -> Queue:
-        if side.is_bid:
+        if side is Side.BID:
             self.min_bid = min(price, self.min_bid)
         else:
             self.max_ask = max(price, self.max_ask)
 
-        new_queue = Queue(limit=price, side=side, notify=self.send_private)
+        ticks = round(price / self._tick_size)
+        new_queue = Queue(
+            limit=price,
+            limit_ticks=ticks,
+            side=side,
+            notify=self.send_private,
+        )
 
-        logger.debug(f"Creating {new_queue!r}")
+        logger.debug("Creating %r", new_queue)
+        best_queue = self._best(side)
         # If the side of LOB is empty
-        if self.best_queue[side] is None:
-            self.best_queue[side] = new_queue
-            logger.debug(f"The best {side} queue is now: {new_queue!r}")
+        if best_queue is None:
+            self._set_best(side, new_queue)
+            logger.debug("The best %s queue is now: %r", side, new_queue)
             self._update_mid()
         # If we cross the spread then we update the best limits
-        elif side * price > self.best_queue[side].limit * side:
+        elif side * price > best_queue.limit * side:
             logger.debug("Spread has been crossed, updating best limits")
             # No previous Q for a best limit Q
             new_queue.qprev = None
             # The next Q is then the current best
-            new_queue.qnext = self.best_queue[side]
+            new_queue.qnext = best_queue
             # The previous Q of the current best becomes the new Q
-            self.best_queue[side].qprev = new_queue
+            best_queue.qprev = new_queue
             # We are now the best limit
-            self.best_queue[side] = new_queue
+            self._set_best(side, new_queue)
             self._update_mid()
-            logger.debug(f"The best {side} queue is now: {new_queue!r}")
+            logger.debug("The best %s queue is now: %r", side, new_queue)
 
         # We are not crossing the spread then we need to find the previous
-        # Q for this limit
+        # Q for this limit. The price is strictly behind the best limit, so
+        # its closest neighbour towards the best is a queue of the same side
         else:
-            prev_queue = self._find_prev_queue(price, side)
+            idx = bisect_left(self._ticks, ticks)
+            prev_ticks = self._ticks[idx if side is Side.BID else idx - 1]
+            prev_queue = self.queues[prev_ticks]
+            logger.debug("previous queue %r found", prev_queue)
             new_queue.qprev = prev_queue
             new_queue.qnext = prev_queue.qnext
             if prev_queue.qnext is not None:
                 prev_queue.qnext.qprev = new_queue
             prev_queue.qnext = new_queue
 
-        self.queues[price] = new_queue
-        logger.debug(f"{new_queue!r} created.")
+        self.queues[ticks] = new_queue
+        insort(self._ticks, ticks)
+        logger.debug("%r created.", new_queue)
         logger.debug(
-            f"New min bid: {self.min_bid}, new max ask = {self.max_ask}"
+            "New min bid: %s, new max ask = %s", self.min_bid, self.max_ask
         )
         return new_queue
 
-    def _find_prev_queue(self, limit: float, side: Side) -> Queue:
-        it = 0
-        current_limit = limit
-        while True:
-            it += 1
-            current_limit = self._instrument.adjust_price(
-                current_limit + self.tick_size * side
-            )
-            # logger.debug(f"testing {current_limit=}")
-            current_queue = self.queues.get(current_limit)
-            if current_queue is not None:
-                logger.debug(
-                    f"previous queue {current_queue!r} found after"
-                    f" {it} iterations"
-                )
-                return current_queue
+    def _sweep_queue(self, queue: Queue, quantity: float) -> float:
+        """Fills the orders of `queue` from its head until `quantity` is
+        consumed or the queue runs out of orders.
+
+        Filled orders are removed from the queue and from the order map.
+        The caller is responsible for updating the side volume and for
+        deleting the queue once empty.
+
+        Returns
+        -------
+
+        filled: float
+            The quantity executed against the queue.
+        """
+        qty_prec = self._qty_prec
+        order_map = self.order_map
+        left = quantity
+        while left != 0 and queue.ohead is not None:
+            order = queue.ohead
+            qty = min(left, order.remaining)
+            queue.fill(order, qty)
+            if order.filled:
+                queue.remove(order)
+                del order_map[order.order_id]
+            left = round(left - qty, qty_prec)
+        return round(quantity - left, qty_prec)
+
+    def _best(self, side: Side) -> Queue:
+        return self._best_bid if side is Side.BID else self._best_ask
+
+    def _set_best(self, side: Side, queue: Queue):
+        if side is Side.BID:
+            self._best_bid = queue
+        else:
+            self._best_ask = queue
+
+    def _volume(self, side: Side) -> float:
+        return self._bid_volume if side is Side.BID else self._ask_volume
 
-    def _get_order(self, order_id: str) -> Order:
+    def _add_volume(self, side: Side, quantity: float):
+        self.version += 1
+        if side is Side.BID:
+            volume = self._bid_volume + quantity
+            self._bid_volume = round(volume, self._qty_prec)
+        else:
+            volume = self._ask_volume + quantity
+            self._ask_volume = round(volume, self._qty_prec)
+
+    def _get_order(self, order_id: int) -> Order:
         order = self.order_map.get(order_id)
         if order is None:
-            e = OrderbookException(f"No order with id {order_id} found")
-            logger.exception(e)
-            raise e
+            raise OrderbookException(f"No order with id {order_id} found")
         return order
 
     def _insert_order(self, order: Order):
-        logger.info(f"Placing a limit {order=!s}")
+        logger.info("Placing a limit order=%s", order)
         self.order_map[order.order_id] = order
-        if order.price in self.queues:
-            queue = self.queues[order.price]
-        else:
+        queue = self.queues.get(round(order.price / self._tick_size))
+        if queue is None:
             queue = self._create_queue(order.side, order.price)
         queue.add(order)
-        self.best_volumes[order.side] = self._instrument.adjust_quantity(
-            self.best_volumes[order.side] + order.quantity
-        )
-        logger.info(f"Placed {order=!s}")
+        self._add_volume(order.side, order.quantity)
+        logger.info("Placed order=%s", order)
 
     def _delete_queue(self, side: Side, queue: Queue):
         # Check if we are deleting a best queue
-        if queue == self.best_queue[side]:
-            self.best_queue[side] = queue.qnext
+        if queue is self._best(side):
+            self._set_best(side, queue.qnext)
             if queue.qnext is not None:
                 queue.qnext.qprev = None
             self._update_mid()
@@ -514,18 +608,23 @@ class Orderbook:
             queue.qprev.qnext = queue.qnext
             if queue.qnext is not None:
                 queue.qnext.qprev = queue.qprev
-        logger.debug(f"{queue!r} is being deleted")
-        if side.is_bid and queue.limit == self.min_bid:
+        logger.debug("%r is being deleted", queue)
+        if side is Side.BID and queue.limit == self.min_bid:
             if queue.qprev is None:
                 self.min_bid = float("inf")
             else:
                 self.min_bid = queue.qprev.limit
-        if not side.is_bid and queue.limit == self.max_ask:
+        if side is Side.ASK and queue.limit == self.max_ask:
             if queue.qprev is None:
                 self.max_ask = 0
             else:
                 self.max_ask = queue.qprev.limit
-        del self.queues[queue.limit]
+        self._remove_queue(queue)
+
+    def _remove_queue(self, queue: Queue):
+        ticks = queue.limit_ticks
+        del self.queues[ticks]
+        del self._ticks[bisect_left(self._ticks, ticks)]
 
     def _reject_market(self, client_id: str, reason=None, **kwargs):
         reason = reason or "No available liquidity in maket."
@@ -538,40 +637,49 @@ class Orderbook:
         message.update(kwargs)
         self.send_private(client_id, message)
 
+    def _render_side(self, side: Side) -> List[str]:
+        """Formats the queues of one `side`, from the best limit outwards.
+
+        Empty limits between two queues are rendered as placeholder rows,
+        up to `MAX_EMPTY_ROWS` per gap. Larger gaps are elided.
+        """
+        rows = []
+        queue = self._best(side)
+        while queue is not None:
+            rows.append(
+                f"[V={queue.volume:<8} N={queue.nb_orders:<3}]"
+                f"\tP={queue.limit:<16} |{queue}"
+            )
+            qnext = queue.qnext
+            if qnext is not None:
+                ticks = queue.limit_ticks
+                gap = abs(ticks - qnext.limit_ticks) - 1
+                if gap > self.MAX_EMPTY_ROWS:
+                    rows.append(f"[{'...':^16}]\t{'':<18} |")
+                else:
+                    tick_size = self._tick_size
+                    price_prec = self._price_prec
+                    for k in range(1, gap + 1):
+                        price = (ticks - side * k) * tick_size
+                        price = round(price, price_prec)
+                        rows.append(f"[V={0:<8} N={0:<3}]\tP={price:<16} |")
+            queue = qnext
+        return rows
+
     def __str__(self):
         divider = colored("=" * 40, "blue")
-        bid_str = ""
-        best_bid = self.best_queue[Side.BID]
-        best_ask = self.best_queue[Side.ASK]
-
-        if best_bid is None:
-            bid_str = "|\n"
+        bid_rows = self._render_side(Side.BID)
+        ask_rows = self._render_side(Side.ASK)
+        if bid_rows:
+            bid_rows.reverse()
+            bid_str = "\n".join(bid_rows) + "\n"
         else:
-            price = self.min_bid
-            while price <= best_bid.limit:
-                queue = self.queues.get(price)
-                if queue is None:
-                    bid_str += f"[V={0:<8} N={0:<3}]\tP={price:<16} |"
-                else:
-                    bid_str += f"[V={queue.volume:<8} N={queue.nb_orders:<3}]"
-                    bid_str += f"\tP={price:<16} |{queue}"
-                bid_str += "\n"
-                price = self._instrument.adjust_price(price + self.tick_size)
+            bid_str = "|\n"
 
-        ask_str = ""
-        if best_ask is None:
-            ask_str = "|"
+        if ask_rows:
+            ask_str = "\n".join(ask_rows) + "\n"
         else:
-            price = best_ask.limit
-            while price <= self.max_ask:
-                queue = self.queues.get(price)
-                if queue is None:
-                    ask_str += f"[V={0:<8} N={0:<3}]\tP={price:<16} |"
-                else:
-                    ask_str += f"[V={queue.volume:<8} N={queue.nb_orders:<3}]"
-                    ask_str += f"\tP={price:<16} |{queue}"
-                ask_str += "\n"
-                price = self._instrument.adjust_price(price + self.tick_size)
+            ask_str = "|"
 
         mid = self.mid_price
         if mid is not None:
@@ -579,6 +687,6 @@ class Orderbook:
         else:
             spread_string = f"{divider}"
         header = f"Orderbook for symbol {self._instrument.symbol}:\n"
-        header += f"Total bid volume {self.best_volumes[Side.BID]}\t"
-        header += f"Total ask volume {self.best_volumes[Side.ASK]}\n\n"
+        header += f"Total bid volume {self._bid_volume}\t"
+        header += f"Total ask volume {self._ask_volume}\n\n"
         return f"{header}{bid_str}{spread_string} Mid-price\n{ask_str}"
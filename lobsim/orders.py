@@ -1,19 +1,23 @@
 from __future__ import annotations
 import logging
-import uuid
+import itertools
 from enum import Enum
+from enum import IntEnum
 from dataclasses import dataclass
+from dataclasses import field
 from typing import Self, Dict, TypeAlias
 
 from lobsim.utils import now
 from lobsim.utils import Timestamp
-from lobsim.utils import exist_any
 from lobsim.instruments import Instrument
 
 logger = logging.getLogger(__name__)
 
 Queue: TypeAlias = "Queue"
 
+# Order ids are only used as keys within a single engine.
+_order_id_seq = itertools.count(1)
+
 
 class OrderType(Enum):
     CANCEL = "CANCEL"
@@ -39,7 +43,7 @@ class TimeInForce(Enum):
     GTD = "GTD"
 
 
-class Side(Enum):
+class Side(IntEnum):
     BID = 1
     ASK = -1
 
@@ -59,20 +63,18 @@ class Side(Enum):
         return Side.ASK
 
     def __neg__(self) -> Self:
-        if self == Side.BID:
-            return Side.ASK
-        return Side.BID
-
-    def __mul__(self, x: float) -> float:
-        return self.value * x
-
-    __rmul__ = __mul__
+        return self._opposite
 
     def __str__(self):
         return self.name
 
 
-@dataclass
+# Resolve the opposite sides once so that `-side` is a plain attribute load
+Side.BID._opposite = Side.ASK
+Side.ASK._opposite = Side.BID
+
+
+@dataclass(slots=True)
 class Trade:
     trade_id: str
     instrument: Instrument
@@ -82,9 +84,9 @@ class Trade:
     engine_ts: Timestamp = now()
 
 
-@dataclass
+@dataclass(slots=True)
 class Fill:
-    order_id: str
+    order_id: int
     price: float
     quantity: float
     created: Timestamp = now()
@@ -94,29 +96,37 @@ class Fill:
         f"quantity={self.quantity}, engine_ts={self.created})"
 
 
-@dataclass
+@dataclass(slots=True)
 class Order:
     owner: str
     instrument: Instrument
     side: Side
     quantity: float
     price: float
+    # reference to the previous order
+    oprev: Self = field(init=False, repr=False, compare=False)
+    # reference to the next order
+    onext: Self = field(init=False, repr=False, compare=False)
+    # reference to the orders' own queue
+    queue: Queue = field(init=False, repr=False, compare=False)
+    # timestamp of the moment the order has been updated
+    updated: Timestamp = field(init=False)
+    # timestamp of the moment theorder has been created
+    created: Timestamp = field(init=False)
+    order_id: int = field(init=False)
+    # remaining quantity after fills have been added
+    remaining: float = field(init=False)
+    last_filled_quantity: float = field(init=False)
 
     def __post_init__(self):
         engine_ts = now()
-        # reference to the previous order
-        self.oprev: Self = None
-        # reference to the next order
-        self.onext: Self = None
-        # reference to the orders' own queue
-        self.queue: Queue = None
-        # timestamp of the moment the order has been updated
-        self.updated: Timestamp = engine_ts
-        # timestamp of the moment theorder has been created
-        self.created: Timestamp = engine_ts
-        self.order_id: str = str(uuid.uuid4())
-        # remaining quantity after fills have been added
-        self.remaining: float = self.quantity
+        self.oprev = None
+        self.onext = None
+        self.queue = None
+        self.updated = engine_ts
+        self.created = engine_ts
+        self.order_id = next(_order_id_seq)
+        self.remaining = self.quantity
         self.last_filled_quantity = 0
 
     @property
@@ -166,7 +176,11 @@ class Order:
 
         """
         logger.debug(
-            f"Updating order {self}: {quantity=}, {price=}, queue={queue!r}"
+            "Updating order %s: quantity=%r, price=%r, queue=%r",
+            self,
+            quantity,
+            price,
+            queue,
         )
         if price is not None:
             self.price = price
@@ -178,7 +192,7 @@ class Order:
         if queue is not None:
             self.queue = queue
 
-        if exist_any(price, quantity, queue):
+        if price is not None or quantity is not None or queue is not None:
             self.updated = now()
 
     def add_fill(self, quantity: float) -> Fill:
@@ -192,19 +206,22 @@ class Order:
             The quantity should be between `min_qty` and `max_qty`
         """
         update_ts = now()
-        logger.debug(f"Adding Fill({quantity=})")
+        logger.debug("Adding Fill(quantity=%r)", quantity)
         fill = Fill(self.order_id, self.price, quantity, update_ts)
         self.last_filled_quantity = quantity
         v_precision = self.instrument.precision.quote_precision
         self.remaining = round(self.remaining - quantity, v_precision)
         self.updated = update_ts
-        logger.info(f"Added Fill({quantity=}) to {self}")
+        logger.info("Added Fill(quantity=%r) to %s", quantity, self)
         return fill
 
     def __str__(self):
         odata = self.infos()
-        params = ", ".join(f"{k}={str(odata[k])}" for k in self.infos())
+        params = ", ".join(f"{k}={v!s}" for k, v in odata.items())
         return f"Order({params})"
 
     def __eq__(self, other: Self):
         return self.order_id == other.order_id
+
+    def __hash__(self):
+        return hash(self.order_id)
@@ -1,9 +1,11 @@
 import logging
 from dataclasses import dataclass
-from typing import Self, Callable, TypeAlias
+from dataclasses import field
+from typing import Self, Callable, List, TypeAlias
 from termcolor import colored
 
 from lobsim.orders import Side
+from lobsim.utils import now
 
 logger = logging.getLogger(__name__)
 
@@ -11,20 +13,28 @@ logger = logging.getLogger(__name__)
 Order: TypeAlias = "Order"
 
 
-@dataclass
+@dataclass(slots=True)
 class Queue:
     limit: float
+    # the limit as a number of ticks
+    limit_ticks: int
     side: Side
     notify: Callable
     volume_precision: int = 2
+    qprev: Self = field(init=False, repr=False)
+    qnext: Self = field(init=False, repr=False)
+    ohead: Order = field(init=False, repr=False)
+    otail: Order = field(init=False, repr=False)
+    volume: float = field(init=False)
+    nb_orders: int = field(init=False)
 
     def __post_init__(self):
-        self.qprev: Self = None
-        self.qnext: Self = None
-        self.ohead: Order = None
-        self.otail: Order = None
-        self.volume: float = 0.0
-        self.nb_orders: int = 0
+        self.qprev = None
+        self.qnext = None
+        self.ohead = None
+        self.otail = None
+        self.volume = 0.0
+        self.nb_orders = 0
 
     @property
     def empty(self) -> bool:
@@ -32,25 +42,50 @@ class Queue:
 
     def add(self, order: Order):
         """Adds an `order` to the queue"""
-        logger.debug(f"Adding {order=!s}")
-        if self.ohead is None:
+        logger.debug("Adding order=%s", order)
+        otail = self.otail
+        order.oprev = otail
+        order.onext = None  # I am the last order of the Q
+        if otail is None:
             self.ohead = order
-            self.otail = order
         else:
-            order.oprev = self.otail
-            order.onext = None  # I am the last order of the Q
-            self.otail.onext = order
-            self.otail = order
+            otail.onext = order
+        self.otail = order
 
         self.volume = self._rv(self.volume + order.quantity)
         self.nb_orders += 1
-        order.update(queue=self)
+        order.queue = self
+        order.updated = now()
         self._notify(status="New order", order=order)
-        logger.info(f"Added {order=!s}")
+        logger.info("Added order=%s", order)
+
+    def extend(self, orders: List[Order]):
+        """Appends the `orders` to the queue in a single splice.
+
+        Unlike `add`, no notification is sent. This is meant for seeding
+        the queue with orders that are not owned by a client.
+        """
+        if not orders:
+            return
+        prev = self.otail
+        for order in orders:
+            order.oprev = prev
+            order.queue = self
+            if prev is not None:
+                prev.onext = order
+            prev = order
+        orders[-1].onext = None
+        if self.ohead is None:
+            self.ohead = orders[0]
+        self.otail = orders[-1]
+        volume = sum(order.quantity for order in orders)
+        self.volume = self._rv(self.volume + volume)
+        self.nb_orders += len(orders)
+        logger.info("Added %d orders to %r", len(orders), self)
 
     def remove(self, order: Order):
         """Removes the `order` from the queue"""
-        logger.debug(f"Removing {order=!s}")
+        logger.debug("Removing order=%s", order)
         self.nb_orders -= 1
         # Either the order has been filled and is marked for deletion
         # Or the order is still live and is being cancelled.
@@ -62,30 +97,22 @@ class Queue:
         else:
             self.volume = self._rv(self.volume - order.remaining)
 
-        # If I am the only order in the queue
-        if order == self.ohead and order == self.otail:
-            logger.debug("Removing The only order of the queue")
-            self.ohead = None
-            self.otail = None
-
-        # If I am the tail of the queue
-        elif order == self.otail:
-            logger.debug("Removing the tail order")
-            self.otail = order.oprev
-            order.oprev.onext = None
-
-        # If I am the head of the queue
-        elif order == self.ohead:
-            logger.debug("Removing the head order")
-            self.ohead = order.onext
-            order.onext.oprev = None
+        # Unlink the order, its neighbours being either other orders
+        # or the ends of the queue
+        oprev = order.oprev
+        onext = order.onext
+        if oprev is None:
+            self.ohead = onext
+        else:
+            oprev.onext = onext
+        if onext is None:
+            self.otail = oprev
         else:
-            # If I am in the middel of the queue
-            logger.debug("Removing the order from inside the queue")
-            order.onext.oprev = order.oprev
-            order.oprev.onext = order.onext
+            onext.oprev = oprev
+        order.oprev = None
+        order.onext = None
 
-        logger.info(f"Removed {order=!s} from {self!r}")
+        logger.info("Removed order=%s from %r", order, self)
 
     def fill(self, order: Order, quantity: float):
         """Fills an `order` with `quantity`.
@@ -108,8 +135,9 @@ class Queue:
         else:
             self._notify("Partial fill", order)
             logger.debug(
-                f"Reducing the queue volume from {self.volume}"
-                f"to {self.volume - quantity}"
+                "Reducing the queue volume from %s to %s",
+                self.volume,
+                self.volume - quantity,
             )
             self.volume = self._rv(self.volume - quantity)
 
@@ -131,4 +159,7 @@ class Queue:
         return f"Queue(side={self.side}, limit={self.limit}, volume={self.volume})"
 
     def __eq__(self, other: Self) -> bool:
-        return self.limit == other.limit
+        return self.limit_ticks == other.limit_ticks
+
+    def __hash__(self) -> int:
+        return hash(self.limit_ticks)
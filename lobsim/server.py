@@ -1,6 +1,6 @@
 import logging
 import signal
-import json
+import socket
 import asyncio
 import websockets
 from functools import partial
@@ -10,6 +10,13 @@ from lobsim.orders import Side
 from lobsim.config import NetworkConfig
 from lobsim.config import ExchangeConfig
 from lobsim.utils import build_message
+from lobsim.utils import loads
+from lobsim.utils import join_messages
+from lobsim.utils import join_packed
+from lobsim.utils import msgpack
+from lobsim.utils import pack_message
+from lobsim.utils import unpack_message
+from lobsim.utils import MSGPACK_SUBPROTOCOL
 from lobsim.utils import _PubSub
 from lobsim.instruments import Instrument
 
@@ -18,6 +25,9 @@ logger = logging.getLogger(__name__)
 
 class WebsocketServer:
 
+    # maximum number of pending batches for each public subscriber
+    OUTBOX_SIZE = 1024
+
     def __init__(
         self,
         instrument: Instrument,
@@ -26,62 +36,133 @@ class WebsocketServer:
         client_timeout: int = 10,
     ):
 
-        self.tasks = {}
+        # private forwarding task of each client, keyed by client id
+        self._private_tasks = {}
+        # every task started by the server, cancelled on reset
+        self._tasks = set()
         self._public_chanel = {}
         self._private_chanel = {}
+        # private chanels fed during the current loop iteration
+        self._private_pending = set()
 
         self.port = network_config.port
         self.host = network_config.host
+        self._send_buffer = network_config.send_buffer
+        self._write_limit = network_config.write_limit
 
         self._trades_freq = exchange_config.trades_freq
         self._quotes_freq = exchange_config.quotes_freq
+        self._quotes_depth = exchange_config.quotes_depth
+        self._snapshot_freq = exchange_config.snapshot_freq
+
+        if exchange_config.binary:
+            if msgpack is None:
+                raise ImportError("msgpack is required for binary feeds")
+            self._subprotocols = [MSGPACK_SUBPROTOCOL]
+            self._build_message = pack_message
+            self._join_messages = join_packed
+            self._loads = unpack_message
+        else:
+            self._subprotocols = None
+            self._build_message = build_message
+            self._join_messages = join_messages
+            self._loads = loads
 
         self.client_timeout = client_timeout
         self._orderbook = Orderbook(
             instrument=instrument, send_private=self._private_broadcast
         )
+        self._path_handlers = {
+            "/private": self._on_private,
+            "/public": self._on_public,
+        }
+        # OrderType.MARKETABLE is an alias of OrderType.LIMIT,
+        # marketable prices are routed by `on_limit`
+        self._order_handlers = {
+            OrderType.LIMIT: self._orderbook.on_limit,
+            OrderType.AMEND: self._orderbook.on_amend,
+            OrderType.MARKET: self._orderbook.on_market,
+            OrderType.CANCEL: self._orderbook.on_cancel,
+        }
 
-        self._add_signal_handlers()
+        # set to stop the server, on signals or on reset
+        self._shutdown = asyncio.Event()
 
     def public_chanel(self, key: str):
-        if key not in self._public_chanel:
-            self._public_chanel[key] = _PubSub()
-        return self._public_chanel[key]
+        chanel = self._public_chanel.get(key)
+        if chanel is None:
+            chanel = self._public_chanel[key] = _PubSub()
+        return chanel
 
     def private_chanel(self, key: str):
-        if key not in self._private_chanel:
-            self._private_chanel[key] = _PubSub()
-        return self._private_chanel[key]
+        chanel = self._private_chanel.get(key)
+        if chanel is None:
+            chanel = self._private_chanel[key] = _PubSub()
+        return chanel
 
     async def start(self):
+        signals = (signal.SIGQUIT, signal.SIGINT, signal.SIGTERM)
+        loop = asyncio.get_running_loop()
+        for sig in signals:
+            loop.add_signal_handler(sig, partial(self._on_signal, sig))
         try:
-            async with websockets.serve(self._start, self.host, self.port):
+            async with websockets.serve(
+                self._start,
+                self.host,
+                self.port,
+                subprotocols=self._subprotocols,
+                ping_interval=self.client_timeout,
+                ping_timeout=self.client_timeout,
+                write_limit=self._write_limit,
+                # broadcast frames are identical for all the subscribers,
+                # deflating them per connection is wasted work
+                compression=None,
+            ):
                 # start broadcasting public feed to clients
                 async with asyncio.TaskGroup() as tg:
                     logger.info("Starting Quotes stream")
-                    tg.create_task(self._quotes_stream(), name="quote_task")
+                    quotes = self._quotes_stream()
+                    self._track(tg.create_task(quotes, name="quote_task"))
                     logger.info("Starting Trades stream")
-                    tg.create_task(self._trades_stream(), name="trade_task")
+                    trades = self._trades_stream()
+                    self._track(tg.create_task(trades, name="trade_task"))
                     logger.info("Starting lobviz stream")
-                    tg.create_task(self._lobviz_stream(), name="lobviz_task")
+                    lobviz = self._lobviz_stream()
+                    self._track(tg.create_task(lobviz, name="lobviz_task"))
+                    await self._shutdown.wait()
+                    self.reset()
                 logger.warning("Terminated public feed")
         except asyncio.CancelledError:
             logger.warning("Stopping the server, Good Bye!")
+        finally:
+            for sig in signals:
+                loop.remove_signal_handler(sig)
 
     def reset(self):
-        for task in asyncio.tasks.all_tasks():
+        self._shutdown.set()
+        for task in list(self._tasks):
             task.cancel("Server shutdown")
         self._public_chanel.clear()
         self._private_chanel.clear()
 
+    def _track(self, task: asyncio.Task) -> asyncio.Task:
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
     async def _lobviz_stream(self):
         topic = "lobviz"
+        chanel = self.public_chanel(topic)
+        version = None
         while True:
             try:
-                message = build_message(
-                    event=topic, data=dict(lob=str(self._orderbook))
-                )
-                self.public_chanel(topic).publish(message)
+                # the book is only rendered again when it has changed
+                if version != self._orderbook.version:
+                    version = self._orderbook.version
+                    message = self._build_message(
+                        event=topic, data=dict(lob=str(self._orderbook))
+                    )
+                chanel.publish(message)
                 await asyncio.sleep(self._quotes_freq)
             except asyncio.CancelledError:
                 logger.warning("Cancelling lobviz stream")
@@ -89,11 +170,22 @@ class WebsocketServer:
 
     async def _quotes_stream(self):
         topic = "quotes"
+        chanel = self.public_chanel(topic)
+        loop = asyncio.get_running_loop()
+        version = None
+        last_sent = 0.0
         while True:
             try:
-                lob_state = self._orderbook.get_state()
-                message = build_message(event=topic, data=lob_state)
-                self.public_chanel(topic).publish(message)
+                ts = loop.time()
+                if (
+                    version != self._orderbook.version
+                    or ts - last_sent >= self._snapshot_freq
+                ):
+                    version = self._orderbook.version
+                    last_sent = ts
+                    lob_state = self._orderbook.get_state(self._quotes_depth)
+                    message = self._build_message(event=topic, data=lob_state)
+                    chanel.publish(message)
                 await asyncio.sleep(self._quotes_freq)
             except asyncio.CancelledError:
                 logger.warning("Cancelling quotes stream")
@@ -101,74 +193,111 @@ class WebsocketServer:
 
     async def _trades_stream(self):
         topic = "trades"
+        chanel = self.public_chanel(topic)
         while True:
             try:
-                message = build_message(
+                message = self._build_message(
                     event=topic, message="Not yet implemented"
                 )
-                self.public_chanel(topic).publish(message)
+                chanel.publish(message)
                 await asyncio.sleep(self._trades_freq)
             except asyncio.CancelledError:
                 logger.warning("Cancelling trades stream")
                 break
 
-    async def _send_custom_ping(self, websocket):
-        client_id = str(websocket.id)
-        while True:
-            try:
-                await asyncio.sleep(self.client_timeout)
-                await websocket.ping(client_id)
-            except websockets.ConnectionClosed:
-                logger.debug(f"{client_id=} disconnected. Cleaning up.")
-                self._clean_private(
-                    client_id, err_msg="Client disconnected."
-                )
-                break
-
     async def _start(self, websocket):
         client_id = str(websocket.id)
+        sock = websocket.transport.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(
+                socket.SOL_SOCKET, socket.SO_SNDBUF, self._send_buffer
+            )
         try:
             path = websocket.request.path
-            logger.info(f"Incoming request through {path=}")
+            logger.info("Incoming request through path=%r", path)
+            handler = self._path_handlers.get(path)
             async for message in websocket:
-                message = json.loads(message)
-                logger.debug(f"Received: {message=}")
-                match path:
-                    case "/private":
-                        await self._on_private(websocket, message)
-
-                    case "/public":
-                        await self._on_public(websocket, message)
-
-                    case _:
-                        await self._on_error(websocket, f"Unknown {path=}")
+                message = self._loads(message)
+                logger.debug("Received: message=%r", message)
+                if handler is None:
+                    await self._on_error(websocket, f"Unknown {path=}")
+                else:
+                    await handler(websocket, message, client_id)
         except websockets.ConnectionClosed:
             logger.warning(f"{client_id=} disconnected.")
+        finally:
+            self._clean_private(client_id, err_msg="Client disconnected.")
 
     def _clean_private(self, client_id: str, err_msg: str = ""):
+        task = self._private_tasks.pop(client_id, None)
+        if task is not None:
+            task.cancel()
         if client_id in self._private_chanel:
             del self._private_chanel[client_id]
-            logger.debug(f"Data cleanup for {client_id=} Done.")
+            logger.debug("Data cleanup for client_id=%r Done.", client_id)
         else:
-            logger.debug(f"Nothing to clean for {client_id=}")
+            logger.debug("Nothing to clean for client_id=%r", client_id)
 
     async def _on_error(self, websocket, message):
         logger.error(message)
-        message = build_message(event="error", message=message)
-        websocket.send(message)
+        message = self._build_message(event="error", message=message)
+        await websocket.send(message)
 
-    async def _on_public(self, websocket, message):
+    async def _on_public(self, websocket, message, client_id):
         event_type = message["event"]
-        logger.info(f"Listening for {event_type} events.")
-        async for message in self.public_chanel(event_type):
-            await websocket.send(message)
+        # several topics can be multiplexed over the same connection
+        if event_type == "subscribe":
+            topics = message["topics"]
+        else:
+            topics = (event_type,)
+        logger.info("Listening for %s events.", topics)
+        outbox = asyncio.Queue(maxsize=self.OUTBOX_SIZE)
+        feeders = [
+            self._track(
+                asyncio.create_task(
+                    self._feed_outbox(self.public_chanel(topic), outbox),
+                    name=f"{client_id}_{topic}",
+                )
+            )
+            for topic in topics
+        ]
+        try:
+            await self._send_outbox(websocket, outbox)
+        finally:
+            for feeder in feeders:
+                feeder.cancel()
 
-    async def _on_private(self, websocket, message):
+    @staticmethod
+    async def _feed_outbox(chanel, outbox):
+        try:
+            async for batch in chanel.batches():
+                if outbox.full():
+                    # slow client, the oldest messages are dropped
+                    outbox.get_nowait()
+                outbox.put_nowait(batch)
+        finally:
+            # None tells the sender that the feed is over
+            if outbox.full():
+                outbox.get_nowait()
+            outbox.put_nowait(None)
+
+    async def _send_outbox(self, websocket, outbox):
+        while True:
+            batch = await outbox.get()
+            if batch is None:
+                return
+            while not outbox.empty():
+                pending = outbox.get_nowait()
+                if pending is None:
+                    return
+                batch = batch + pending
+            await websocket.send(self._join_messages(batch))
+
+    async def _on_private(self, websocket, message, client_id):
         event_type = message["event"]
-        client_id = str(websocket.id)
         match event_type:
             case "init":
-                await self._on_trading_init(websocket)
+                await self._on_trading_init(websocket, client_id)
             case "trade":
                 params = message.get("params")
                 if params is None:
@@ -176,57 +305,74 @@ class WebsocketServer:
                         websocket,
                         f"Missing data from {client_id=}. {message=}",
                     )
+                elif isinstance(params, list):
+                    # orders coalesced by the client in a single message
+                    # a failed order is rejected without dropping the others
+                    for order_params in params:
+                        try:
+                            await self._on_trading_request(order_params)
+                        except Exception as e:
+                            await self._on_error(
+                                websocket,
+                                f"Rejected {order_params=}: {e!r}",
+                            )
                 else:
                     await self._on_trading_request(params)
 
             case _:
-                await self._on_error(client_id, f"Unknown {event_type=}")
+                await self._on_error(websocket, f"Unknown {event_type=}")
 
-    async def _on_trading_init(self, websocket):
-        client_id = str(websocket.id)
+    async def _on_trading_init(self, websocket, client_id):
         await websocket.send(client_id)
-        asyncio.create_task(
-            self._send_custom_ping(websocket)
+        # private messages are forwarded while `_start` keeps reading the
+        # connection, which ends once the keepalive pings go unanswered
+        self._private_tasks[client_id] = self._track(
+            asyncio.create_task(
+                self._forward_private(websocket, client_id),
+                name=f"{client_id}_private",
+            )
         )
-        async for message in self.private_chanel(client_id):
-            await websocket.send(message)
+
+    async def _forward_private(self, websocket, client_id):
+        try:
+            async for batch in self.private_chanel(client_id).batches():
+                await websocket.send(self._join_messages(batch))
+        except websockets.ConnectionClosed:
+            logger.debug("Stopped forwarding to client_id=%r", client_id)
 
     async def _on_trading_request(self, params):
-        logger.debug(f"Received {params=}")
+        logger.debug("Received params=%r", params)
         order_type = OrderType(params["order_type"])
         del params["order_type"]
         if "side" in params:
             params["side"] = Side(params["side"])
-        logger.debug(f"Placing a {order_type!s} order with {params=}")
-        match order_type:
-            case OrderType.LIMIT:
-                self._orderbook.on_limit(**params)
-            case OrderType.AMEND:
-                self._orderbook.on_amend(**params)
-            case OrderType.MARKET:
-                self._orderbook.on_market(**params)
-            case OrderType.CANCEL:
-                self._orderbook.on_cancel(**params)
-            case OrderType.MARKETABLE:
-                self._orderbook.on_marketable(**params)
-            case _:
-                logger.error(f"Unknown {order_type=}")
+        logger.debug(
+            "Placing a %s order with params=%r", order_type, params
+        )
+        handler = self._order_handlers.get(order_type)
+        if handler is None:
+            logger.error(f"Unknown {order_type=}")
+        else:
+            handler(**params)
 
     def _private_broadcast(self, client_id, message):
-        message = build_message(event="private", data=message)
-        logger.debug(f"Publishing {message=} to {client_id=}")
-        self.private_chanel(client_id).publish(message)
-        logger.debug(f"Published {message=} to {client_id=}")
-
-    def _add_signal_handlers(self):
+        message = self._build_message(event="private", data=message)
+        logger.debug(
+            "Publishing message=%r to client_id=%r", message, client_id
+        )
+        chanel = self.private_chanel(client_id)
+        chanel.feed(message)
+        # the messages of a request are flushed together once it is done
+        if not self._private_pending:
+            asyncio.get_running_loop().call_soon(self._flush_private)
+        self._private_pending.add(chanel)
 
-        def catch_interruptions(signal, loop):
-            logger.warning(f"Received {signal=}. Shutting down the server.")
-            self.reset()
-            loop.stop()
+    def _flush_private(self):
+        pending = self._private_pending
+        self._private_pending = set()
+        for chanel in pending:
+            chanel.flush()
 
-        event_loop = asyncio.get_event_loop()
-        signals = (signal.SIGQUIT, signal.SIGINT, signal.SIGTERM)
-        for sig in signals:
-            callback = partial(catch_interruptions, sig, event_loop)
-            event_loop.add_signal_handler(sig, callback)
+    def _on_signal(self, sig):
+        logger.warning(f"Received signal={sig!r}. Shutting down the server.")
+        self._shutdown.set()
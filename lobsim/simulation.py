@@ -1,33 +1,335 @@
+import asyncio
 import logging
 
-from typing import Callable, override
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple, override
 
 from lobsim.instruments import Instrument, instruments
 from lobsim.orders import Side
 from lobsim.orders import OrderType
 from lobsim.client import WebsocketClient
+from lobsim.client import LOBVIZ, QUOTES, TRADES, TRADING
+from lobsim.utils import _noop
+from lobsim.utils import is_divisible
 
 logger = logging.getLogger(__name__)
 
+# subscriptions requested inside `VirtualExchange.subscribing()`
+_subscribe_batch: ContextVar[Dict[str, Callable]] = ContextVar(
+    "_subscribe_batch", default=None
+)
+
+_OT_LIMIT, _OT_MARKET, _OT_MARKETABLE, _OT_CANCEL, _OT_AMEND = map(
+    str,
+    (
+        OrderType.LIMIT,
+        OrderType.MARKET,
+        OrderType.MARKETABLE,
+        OrderType.CANCEL,
+        OrderType.AMEND,
+    ),
+)
+
+_SIDE_BUY = Side.lob_side("Buy")
+_SIDE_SELL = Side.lob_side("Sell")
+_SIDE = {
+    "Buy": _SIDE_BUY,
+    "Sell": _SIDE_SELL,
+    "BUY": _SIDE_BUY,
+    "SELL": _SIDE_SELL,
+}
+
+
+def _check_qty(quantity, step_size, min_qty, max_qty):
+    if not (
+        min_qty <= quantity <= max_qty and is_divisible(quantity, step_size)
+    ):
+        raise ValueError(f"Invalid {quantity=}")
+
+
+def _check_price(price, tick_size, min_price, max_price):
+    if not (
+        min_price <= price <= max_price and is_divisible(price, tick_size)
+    ):
+        raise ValueError(f"Invalid {price=}")
+
+
+def _limits_of(instrument: Instrument) -> Tuple:
+    # (step_size, min_qty, max_qty, tick_size, min_price, max_price)
+    lot_size = instrument.lot_size
+    pd = instrument.price_details
+    return (
+        lot_size.step_size,
+        lot_size.min_qty,
+        lot_size.max_qty,
+        pd.tick_size,
+        pd.min_price,
+        pd.max_price,
+    )
+
+
+@dataclass(slots=True, frozen=True)
+class LimitOrderReq:
+    """A limit order submitted with `VirtualExchange.submit_batch`"""
+
+    side: str
+    quantity: float
+    price: float
+
+
+class BatchedOrderClient:
+    """Wraps a `WebsocketClient` to coalesce the orders placed within
+    `coalesce_ms` milliseconds into a single message.
+
+    Any other attribute is looked up on the wrapped client.
+    """
+
+    def __init__(self, client: WebsocketClient, coalesce_ms: float = 1.0):
+        self._client = client
+        self._coalesce = coalesce_ms / 1000
+        self._pending = []
+        self._flush_handle = None
+        # flushes started by the timer, kept until they are done
+        self._flush_tasks = set()
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    async def place_order(self, flush: bool = False, **kwargs):
+        """Queues an order until the next flush.
+
+        Parameters
+        ----------
+
+        flush: bool, default=False
+            Sends the order, along with any queued one, right away.
+        """
+        self._pending.append(kwargs)
+        if flush:
+            await self.flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                self._coalesce, self._schedule_flush
+            )
+
+    async def flush(self):
+        """Sends all the queued orders in a single message"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._pending:
+            orders = self._pending
+            self._pending = []
+            await self._client.place_orders(orders)
+
+    def _schedule_flush(self):
+        self._flush_handle = None
+        task = asyncio.ensure_future(self.flush())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._on_flushed)
+
+    def _on_flushed(self, task: asyncio.Task):
+        self._flush_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(
+                "Failed to send the queued orders: %r", task.exception()
+            )
+
 
 class VirtualExchange():
 
     name = "Simulation"
+    # pass it as callback to print the messages of a subscription
+    debug_print_callback = staticmethod(print)
+    # instruments looked up so far, shared by all the instances
+    _instrument_cache: Dict[str, Instrument] = {}
+    # classes built by `specialize`, keyed by base class and symbol
+    _specialized: Dict[Tuple[type, str], type] = {}
+
+    def __init__(
+        self,
+        on_trade: Callable = print,
+        coalesce_ms: float = None,
+        nodelay: bool = True,
+        binary: bool = False,
+    ):
+        # (step_size, min_qty, max_qty, tick_size, min_price, max_price)
+        self._validators: Dict[str, Tuple] = {}
+        # callbacks of each subscribed topic, the server is asked only once
+        self._subs: Dict[str, List[Callable]] = {}
+        self._client = WebsocketClient(
+            on_trade=on_trade, binary=binary, nodelay=nodelay
+        )
+        # orders are sent as they come unless a coalescing window is set
+        if coalesce_ms is not None:
+            self._client = BatchedOrderClient(self._client, coalesce_ms)
+
+    async def warmup(self):
+        """Opens the connection to the server used to place orders so that
+        the first order is not delayed by the websocket handshake.
+        """
+        await self._client.warmup()
+
+    async def close(self):
+        if isinstance(self._client, BatchedOrderClient):
+            await self._client.flush()
+        await self._client.close()
+
+    @classmethod
+    def instrument(cls, symbol) -> Instrument:
+        instrument = cls._instrument_cache.get(symbol)
+        if instrument is None:
+            instrument = cls._instrument_cache[symbol] = instruments[symbol]
+        return instrument
+
+    @classmethod
+    def specialize(cls, symbol: str) -> type:
+        """Returns a subclass dedicated to trading `symbol`.
+
+        The limits of `symbol` are bound to its `limit_order`,
+        `marketable_order` and `market_order` methods when the class is
+        built, so they skip the lookup of the limits on each order. The
+        `symbol` argument of these methods becomes optional and must be
+        `symbol` when given. The class is built once per symbol.
+
+        Examples
+        --------
+
+        >>> exchange = VirtualExchange.specialize("TEST SYMBOL")()
+        >>> await exchange.limit_order(side="Buy", quantity=1, price=99.5)
+        """
+        specialized = cls._specialized.get((cls, symbol))
+        if specialized is not None:
+            return specialized
+
+        limits = _limits_of(cls.instrument(symbol))
+        step, min_qty, max_qty, tick, min_p, max_p = limits
+
+        def check_symbol(other):
+            if other is not None and other != symbol:
+                raise ValueError(f"Only {symbol} can be traded, got {other}")
+
+        def priced(order_type):
+            async def place(self, *, side, quantity, price, symbol=None):
+                check_symbol(symbol)
+                _check_qty(quantity, step, min_qty, max_qty)
+                _check_price(price, tick, min_p, max_p)
+
+                await self._client.place_order(
+                    order_type=order_type,
+                    side=_SIDE[side],
+                    quantity=quantity,
+                    price=price,
+                )
+
+            return place
+
+        async def market_order(self, *, side, quantity, symbol=None):
+            check_symbol(symbol)
+            _check_qty(quantity, step, min_qty, max_qty)
+
+            await self._client.place_order(
+                order_type=_OT_MARKET,
+                side=-_SIDE[side],
+                quantity=quantity,
+            )
+
+        namespace = dict(
+            symbol=symbol,
+            limit_order=priced(_OT_LIMIT),
+            marketable_order=priced(_OT_MARKETABLE),
+            market_order=market_order,
+        )
+        for name in ("limit_order", "marketable_order", "market_order"):
+            namespace[name].__doc__ = getattr(cls, name).__doc__
+        specialized = type(f"{cls.__name__}[{symbol}]", (cls,), namespace)
+        cls._specialized[(cls, symbol)] = specialized
+        return specialized
+
+    def _limits(self, symbol) -> Tuple:
+        """Returns the trading limits of `symbol` in the order expected by
+        `_check_qty` and `_check_price`. Built once per symbol.
+        """
+        limits = self._validators.get(symbol)
+        if limits is None:
+            limits = _limits_of(self.instrument(symbol))
+            self._validators[symbol] = limits
+        return limits
+
+    async def subscribe_all(self, symbol: str, callbacks: Dict[str, Callable]):
+        """Subscribes to several topics in one request.
+
+        Parameters
+        ----------
+
+        symbol: str
+            The traded symbol.
+
+        callbacks: Dict[str, Callable]
+            The callback of each topic among trading, lobviz, quotes and
+            trades.
+
+        """
+        async with self.subscribing():
+            for topic, callback in callbacks.items():
+                await self._subscribe(topic, callback)
+
+    @asynccontextmanager
+    async def subscribing(self):
+        """Groups the subscriptions made in the block into a single request
+        sent when leaving it.
+
+        Examples
+        --------
 
-    def __init__(self, on_trade: Callable = print):
-        self._instrument: Instrument = None
-        self._client = WebsocketClient(on_trade=on_trade)
+        >>> async with exchange.subscribing():
+        ...     await exchange.subscribe_execution(on_fill)
+        ...     await exchange.subscribe_orderbook(symbol, callback=on_lob)
+        """
+        pending = {}
+        token = _subscribe_batch.set(pending)
+        try:
+            yield self
+        finally:
+            _subscribe_batch.reset(token)
+        if pending:
+            await self._client.subscribe_many(pending)
+
+    async def _subscribe(self, topic: str, callback: Callable):
+        pending = _subscribe_batch.get()
+        callbacks = self._subs.get(topic)
+        if callbacks is None:
+            # the messages are dropped undecoded until a callback is added
+            callbacks = self._subs[topic] = []
+            if pending is None:
+                await self._client.subscribe(topic, _noop)
+            else:
+                pending[topic] = _noop
+        if callback is None or callback is _noop:
+            return
+        if not callbacks:
+            multicast = self._multicast(callbacks)
+            if pending is not None and topic in pending:
+                pending[topic] = multicast
+            else:
+                self._client.set_callback(topic, multicast)
+        callbacks.append(callback)
+
+    @staticmethod
+    def _multicast(callbacks: List[Callable]) -> Callable:
+        def multicast(message):
+            for callback in callbacks:
+                callback(message)
 
-    def instrument(self, symbol):
-        if self._instrument is None:
-            self._instrument = instruments[symbol]
-        return self._instrument
+        return multicast
 
     @override
     async def subscribe_execution(self, callback=None):
-        callback = callback or print
-        topic = "trading"
-        await self._client.subscribe(topic, callback)
+        callback = callback or _noop
+        topic = TRADING
+        await self._subscribe(topic, callback)
 
     async def subscribe_lobviz(self, callback=None):
         """Register to have a hackish view of the lob.
@@ -38,15 +340,15 @@ class VirtualExchange():
         Parameters
         ----------
 
-        callback: Callable, default=print
+        callback: Callable, default=None
             The function to call when a string representation of the lob is
-            sent by the server. A default callback is set to print if it has
-            None as value
+            sent by the server. The messages are dropped if it has None as
+            value
 
         """
-        callback = callback or print
-        topic = "lobviz"
-        await self._client.subscribe(topic, callback)
+        callback = callback or _noop
+        topic = LOBVIZ
+        await self._subscribe(topic, callback)
 
     @override
     async def subscribe_orderbook(
@@ -65,8 +367,8 @@ class VirtualExchange():
             by the server.
 
         """
-        topic = "quotes"
-        await self._client.subscribe(topic, callback)
+        topic = QUOTES
+        await self._subscribe(topic, callback)
 
     @override
     async def subscribe_trades(
@@ -86,8 +388,8 @@ class VirtualExchange():
             by the server.
 
         """
-        topic = "trades"
-        await self._client.subscribe(topic, callback)
+        topic = TRADES
+        await self._subscribe(topic, callback)
 
     @override
     async def limit_order(
@@ -114,21 +416,50 @@ class VirtualExchange():
             The price should live in the tick-grid, i.e a multiple of
             `tick_size`
         """
-        instrument = self.instrument(symbol)
+        await self._place_priced(_OT_LIMIT, symbol, side, quantity, price)
+
+    async def submit_batch(self, symbol: str, reqs: List[LimitOrderReq]):
+        """Validates all the limit orders of `reqs` then sends them in
+        a single message.
+
+        Parameters
+        ----------
 
-        if not instrument.is_valid_quantity(quantity):
-            e = ValueError(f"Invalid {quantity=}")
-            logger.exception(e)
-            raise e
+        symbol: str
+            The instrument symbol you want to trade
 
-        if not instrument.is_valid_price(price):
-            e = ValueError(f"Invalid {price=}")
-            logger.exception(e)
-            raise e
+        reqs: List[LimitOrderReq]
+            The limit orders, see `limit_order` for the constraints on
+            their quantity and price.
+        """
+        step, min_qty, max_qty, tick, min_p, max_p = self._limits(
+            symbol
+        )
+        orders = []
+        for req in reqs:
+            _check_qty(req.quantity, step, min_qty, max_qty)
+            _check_price(req.price, tick, min_p, max_p)
+            orders.append(
+                dict(
+                    order_type=_OT_LIMIT,
+                    side=_SIDE[req.side],
+                    quantity=req.quantity,
+                    price=req.price,
+                )
+            )
+        if orders:
+            await self._client.place_orders(orders)
+
+    async def _place_priced(self, order_type, symbol, side, quantity, price):
+        step, min_qty, max_qty, tick, min_p, max_p = self._limits(
+            symbol
+        )
+        _check_qty(quantity, step, min_qty, max_qty)
+        _check_price(price, tick, min_p, max_p)
 
         await self._client.place_order(
-            order_type=str(OrderType.LIMIT),
-            side=Side.lob_side(side),
+            order_type=order_type,
+            side=_SIDE[side],
             quantity=quantity,
             price=price,
         )
@@ -149,15 +480,12 @@ class VirtualExchange():
             The order size as a multiple of `step_size`. The quantity should
             be between `min_qty` and `max_qty`
         """
-        instrument = self.instrument(symbol)
-        if not instrument.is_valid_quantity(quantity):
-            e = ValueError(f"Invalid {quantity=}")
-            logger.exception(e)
-            raise e
+        step, min_qty, max_qty = self._limits(symbol)[:3]
+        _check_qty(quantity, step, min_qty, max_qty)
 
         await self._client.place_order(
-            order_type=str(OrderType.MARKET),
-            side=-Side.lob_side(side),
+            order_type=_OT_MARKET,
+            side=-_SIDE[side],
             quantity=quantity,
         )
 
@@ -182,44 +510,27 @@ class VirtualExchange():
             The price should live in the tick-grid, i.e a multiple of
             `tick_size`
         """
-
-        instrument = self.instrument(symbol)
-        if not instrument.is_valid_quantity(quantity):
-            e = ValueError(f"Invalid {quantity=}")
-            logger.exception(e)
-            raise e
-
-        if not instrument.is_valid_price(price):
-            e = ValueError(f"Invalid {price=}")
-            logger.exception(e)
-            raise e
-
-        await self._client.place_order(
-            order_type=str(OrderType.MARKETABLE),
-            side=Side.lob_side(side),
-            quantity=quantity,
-            price=price,
-        )
+        await self._place_priced(_OT_MARKETABLE, symbol, side, quantity, price)
 
     @override
-    async def cancel_order(self, *, order_id: str):
+    async def cancel_order(self, *, order_id: int):
         """Asynchronously sends a cancels order to the simulation server
 
         Parameters
         ----------
 
-        order_id: str
+        order_id: int
             The ID of the order to be canceled
         """
         await self._client.place_order(
-            order_type=str(OrderType.CANCEL), order_id=order_id
+            order_type=_OT_CANCEL, order_id=order_id
         )
 
     @override
     async def amend_order(
         self,
         *,
-        order_id: str,
+        order_id: int,
         symbol: str,
         quantity: float = None,
         price: float = None,
@@ -229,7 +540,7 @@ class VirtualExchange():
         Parameters
         ----------
 
-        order_id: str
+        order_id: int
             The ID of the order to be ameneded
 
         quantity: float
@@ -242,22 +553,16 @@ class VirtualExchange():
             The price should live in the tick-grid, i.e a multiple of
             `tick_size`
         """
-        instrument = self.instrument(symbol)
-        params = dict(order_type=str(OrderType.AMEND), order_id=order_id)
+        step, min_qty, max_qty, tick, min_p, max_p = self._limits(
+            symbol
+        )
+        params = dict(order_type=_OT_AMEND, order_id=order_id)
         if quantity is not None:
-            if instrument.is_valid_quantity(quantity):
-                params["quantity"] = quantity
-            else:
-                e = ValueError(f"Invalid {quantity=}")
-                logger.exception(e)
-                raise e
+            _check_qty(quantity, step, min_qty, max_qty)
+            params["quantity"] = quantity
 
         if price is not None:
-            if instrument.is_valid_price(price):
-                params["price"] = price
-            else:
-                e = ValueError(f"Invalid {price=}")
-                logger.exception(e)
-                raise e
+            _check_price(price, tick, min_p, max_p)
+            params["price"] = price
 
         await self._client.place_order(**params)
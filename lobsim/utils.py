@@ -1,38 +1,88 @@
 import json
 import asyncio
-from decimal import Decimal
 from datetime import datetime
 from typing import TypeAlias
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 Timestamp: TypeAlias = float
 
+# websocket subprotocol of the msgpack encoded feeds
+MSGPACK_SUBPROTOCOL = "msgpack.v1"
+
 
 class _PubSub:
     """Publish-subscribe way to broadcast messages
     Taken from:
         https://websockets.readthedocs.io/en/stable/topics/broadcast.html
+
+    Each link of the chain carries a list of messages so that values fed
+    with `feed` are broadcast together on the next `flush`.
     """
 
     def __init__(self):
-        self.waiter = asyncio.get_running_loop().create_future()
+        self._loop = asyncio.get_running_loop()
+        self.waiter = self._loop.create_future()
+        self._pending = []
 
     def publish(self, value):
+        self._resolve([value])
+
+    def feed(self, value):
+        """Queues a value until the next call to `flush`"""
+        self._pending.append(value)
+
+    def flush(self):
+        """Broadcasts all the values fed since the last flush"""
+        if self._pending:
+            values = self._pending
+            self._pending = []
+            self._resolve(values)
+
+    def _resolve(self, values):
         waiter = self.waiter
-        self.waiter = asyncio.get_running_loop().create_future()
-        waiter.set_result((value, self.waiter))
+        self.waiter = self._loop.create_future()
+        waiter.set_result((values, self.waiter))
 
     async def __aiter__(self):
         """This is the part where the subscription takes palce"""
         waiter = self.waiter
         while True:
-            value, waiter = await waiter
-            yield value
+            values, waiter = await waiter
+            for value in values:
+                yield value
+
+    async def batches(self, limit: int = 128):
+        """Subscribes to the chanel and yields lists of messages.
+
+        All the messages already published when the subscriber wakes up
+        are gathered in a single list of at most about `limit` messages.
+        """
+        waiter = self.waiter
+        while True:
+            batch, waiter = await waiter
+            while waiter.done() and len(batch) < limit:
+                values, waiter = waiter.result()
+                batch = batch + values
+            yield batch
 
 
 def now():
     return datetime.now().timestamp()
 
 
+def _noop(*args, **kwargs):
+    """Default callback of the subscriptions, the messages are dropped"""
+
+
 def exist_none(*args):
     return all(item is None for item in args)
 
@@ -46,10 +96,87 @@ def exist_all(*args):
 
 
 def is_divisible(x: float, y: float) -> bool:
-    return y != 0 and Decimal(str(x)) % Decimal(str(y)) == 0
+    # x is compared to the closest point of the grid of step y, the
+    # tolerance absorbing the representation error of decimal prices
+    # such as 0.3 on a 0.1 grid
+    if y == 0:
+        return False
+    return abs(x - round(x / y) * y) < 1e-9
+
+
+def join_messages(messages):
+    """Merges json encoded messages into a single json array"""
+    if len(messages) == 1:
+        return messages[0]
+    return "[" + ",".join(messages) + "]"
+
+
+if orjson is not None:
+
+    def dumps(obj) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
+    loads = orjson.loads
+else:
+
+    def dumps(obj) -> str:
+        return json.dumps(obj, separators=(",", ":"))
+
+    loads = json.loads
+
+# encoded heads of the messages, keyed by event
+_message_heads = {}
 
 
 def build_message(event, **kwargs):
+    # the message is assembled from its encoded fields rather than
+    # encoding a new dict, the head of each event being encoded once
+    message = _message_heads.get(event)
+    if message is None:
+        message = _message_heads[event] = '{"event":' + dumps(event)
+    for key, value in kwargs.items():
+        message += f',"{key}":{dumps(value)}'
+    return message + "}"
+
+
+# encoded heads of the single order trade messages, keyed by order type
+_order_heads = {}
+
+
+def build_order(order_type, **params):
+    """Encodes the trade message placing a single order, same as
+    `build_message("trade", params=dict(order_type=order_type, **params))`
+    """
+    message = _order_heads.get(order_type)
+    if message is None:
+        message = _order_heads[order_type] = (
+            '{"event":"trade","params":{"order_type":' + dumps(order_type)
+        )
+    for key, value in params.items():
+        message += f',"{key}":{dumps(value)}'
+    return message + "}}"
+
+
+def pack_message(event, **kwargs):
+    """Same as `build_message` but encoded with msgpack"""
     msg_dict = dict(event=event)
     msg_dict.update(kwargs)
-    return json.dumps(msg_dict)
+    return msgpack.packb(msg_dict, use_bin_type=True)
+
+
+def pack_order(order_type, **params):
+    """Same as `build_order` but encoded with msgpack"""
+    params = dict(order_type=order_type, **params)
+    return pack_message("trade", params=params)
+
+
+def join_packed(messages):
+    """Merges msgpack encoded messages into a single msgpack array"""
+    if len(messages) == 1:
+        return messages[0]
+    header = msgpack.Packer().pack_array_header(len(messages))
+    return header + b"".join(messages)
+
+
+def unpack_message(message):
+    return msgpack.unpackb(message, raw=False)
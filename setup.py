@@ -13,6 +13,17 @@ def find_scripts():
     return [os.path.join(root, f) for f in os.listdir(root)]
 
 
+def find_extensions():
+    # Compile the matching engine with Cython when it is available.
+    # The modules are plain python and are used as such otherwise.
+    try:
+        from Cython.Build import cythonize
+    except ImportError:
+        return []
+    modules = ["lobsim/orderbook.py", "lobsim/orders.py", "lobsim/queue.py"]
+    return cythonize(modules, compiler_directives=dict(language_level=3))
+
+
 setup(
     name="lobsim",
     version="1.0.0",
@@ -22,9 +33,11 @@ setup(
     long_description=open("README.md").read(),
     long_description_content_type="text/markdown",
     install_requires=read_requirements(),
+    extras_require=dict(fast=["orjson>=3.9"], binary=["msgpack>=1.0"]),
     url="",
     classifiers=[],
     python_requires=">=3.10",
     packages=find_packages(),
     scripts=find_scripts(),
+    ext_modules=find_extensions(),
 )
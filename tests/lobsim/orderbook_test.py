@@ -4,11 +4,14 @@ from lobsim.orders import Side
 from lobsim.instruments import Instrument, LotSize, Precision, PriceDetails
 
 
+TICK_SIZE = 0.001
+
+
 def send_private(client_id=None, message=None):
     print(client_id, message)
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def instrument():
     return Instrument(
         symbol="TEST SYMBOL",
@@ -25,66 +28,93 @@ def instrument():
             base_asset_precision=0,
         ),
         price_details=PriceDetails(
-            tick_size=0.001, min_price=0.1, max_price=10000
+            tick_size=TICK_SIZE, min_price=0.1, max_price=10000
         ),
         margin_details=None,
     )
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def tick_size(instrument):
     return instrument.price_details.tick_size
 
 
+@pytest.fixture(scope="module")
+def pooled_lob(instrument):
+    return Orderbook(instrument=instrument, send_private=send_private)
+
+
+@pytest.fixture
+def make_lob(pooled_lob):
+    """Returns the orderbook shared by the module, emptied on each call"""
+
+    def make():
+        pooled_lob.reset()
+        return pooled_lob
+
+    return make
+
+
+def find_order(lob, quantity):
+    """Returns the id of the first order of `lob` with `quantity`"""
+    for order in lob.order_map.values():
+        if order.quantity == quantity:
+            return order.order_id
+    return None
+
+
 @pytest.mark.parametrize(
     "input_list, expected",
     (
-        ([], "None"),  # Empty Q
-        ([[Side.ASK, 1, 1]], "1 - 0.5 * tick_size"),  # Empty bid
-        ([[Side.BID, 1, 1]], "1 + 0.5 * tick_size"),  # Empty ask
+        ([], None),  # Empty Q
+        ([[Side.ASK, 1, 1]], 1 - 0.5 * TICK_SIZE),  # Empty bid
+        ([[Side.BID, 1, 1]], 1 + 0.5 * TICK_SIZE),  # Empty ask
         (
             [[Side.ASK, 1, 1]],
-            "1 - 0.5 * tick_size",
+            1 - 0.5 * TICK_SIZE,
         ),  # Empty ask
         (
             [
                 [Side.ASK, 1, 2.2],
                 [Side.BID, 1, 1],
             ],
-            "1.6005",
+            1.6005,
         ),  # In grig ASK first
         (
             [
                 [Side.BID, 1, 1],
                 [Side.ASK, 1, 2.2],
             ],
-            "1.5995",
+            1.5995,
         ),  # In grid BID first
         (
             [
                 [Side.BID, 1, 2.001],
                 [Side.ASK, 1, 2.002],
             ],
-            "2.0015",
+            2.0015,
         ),  # Not in grid tick
     ),
 )
-def test_mid_price(tick_size, input_list, expected, instrument):
-    lob = Orderbook(instrument=instrument, send_private=send_private)
+def test_mid_price(input_list, expected, make_lob):
+    lob = make_lob()
     for lst in input_list:
         side, quantity, price = lst
         lob.on_limit(
             side=side, quantity=quantity, price=price, client_id="test_mid"
         )
-    assert lob.mid_price == eval(expected)
+    if expected is None:
+        assert lob.mid_price is None
+    else:
+        assert lob.mid_price == expected
 
 
 # TODO: ensure rejection and order events are called
 class TestOnLimit:
     # TODO: Further refactoring necessary no need for all this
     @pytest.mark.parametrize("side", (Side.ASK, Side.BID))
-    def test_single_side_inserts(self, instrument, side):
-        lob = Orderbook(instrument=instrument, send_private=send_private)
+    def test_single_side_inserts(self, make_lob, side):
+        lob = make_lob()
         price = 2.002
         other = 2.002 - side * 1
         for i in range(1, 3):
@@ -110,9 +140,9 @@ class TestOnLimit:
         "side, s_price, o_price",
         ((Side.ASK, 3.002, 2), (Side.BID, 1.002, 2.002)),
     )
-    def test_opposite(self, side, s_price, o_price, instrument):
+    def test_opposite(self, side, s_price, o_price, make_lob):
         # Add to opposite queue
-        lob = Orderbook(instrument=instrument, send_private=send_private)
+        lob = make_lob()
         lob.on_limit(side, quantity=1, price=s_price, client_id="test_mid")
         lob.on_limit(-side, quantity=1, price=o_price, client_id="test_mid")
         opposite_q = lob.best_queue[-side]
@@ -139,9 +169,9 @@ class TestOnLimit:
         price1,
         price2,
         is_partial,
-        instrument,
+        make_lob,
     ):
-        lob = Orderbook(instrument=instrument, send_private=send_private)
+        lob = make_lob()
         lob.on_limit(
             side, quantity=quantity1, price=price1, client_id="test_mid"
         )
@@ -161,6 +191,18 @@ class TestOnLimit:
             assert side_q.nb_orders == 1
             assert side_q.volume == abs(quantity1 - quantity2)
 
+    @pytest.mark.parametrize("side", (Side.BID, Side.ASK))
+    def test_marketable_releases_filled(self, side, make_lob):
+        lob = make_lob()
+        lob.on_limit(side, quantity=1, price=2.001, client_id="test_mid")
+        lob.on_limit(side, quantity=2, price=2.001, client_id="test_mid")
+        other = 3 - side * 1
+        lob.on_limit(side, quantity=4, price=other, client_id="test_mid")
+        baseline = len(lob.order_map)
+        lob.on_limit(-side, quantity=3, price=2.001, client_id="test_mid")
+        assert len(lob.order_map) == baseline - 2
+        assert all(not o.filled for o in lob.order_map.values())
+
     @pytest.mark.parametrize(
         "side, quantity, prices",
         [
@@ -168,9 +210,9 @@ class TestOnLimit:
             [Side.ASK, 12, [2.000, 2.001, 2.002]],
         ],
     )
-    def test_deep_marketable(self, side, quantity, prices, instrument):
+    def test_deep_marketable(self, side, quantity, prices, make_lob):
         n = len(prices)
-        lob = Orderbook(instrument=instrument, send_private=send_private)
+        lob = make_lob()
         for i in range(n):
             lob.on_limit(
                 side, quantity=1, price=prices[i], client_id="test_mid"
@@ -192,8 +234,8 @@ class TestOnLimit:
             [Side.ASK, [3.002, 2.000, 2.500]],
         ],
     )
-    def test_inside_lob(self, side, prices, instrument):
-        lob = Orderbook(instrument=instrument, send_private=send_private)
+    def test_inside_lob(self, side, prices, make_lob):
+        lob = make_lob()
         n = len(prices)
         lob.on_limit(side, quantity=1, price=prices[0], client_id="test_mid")
         for i in range(1, n):
@@ -206,8 +248,8 @@ class TestOnLimit:
         assert side_q.qnext.limit == prices[-2]
 
     @pytest.mark.parametrize("side", (Side.BID, Side.ASK))
-    def test_outside_lob(self, side, instrument):
-        lob = Orderbook(instrument=instrument, send_private=send_private)
+    def test_outside_lob(self, side, make_lob):
+        lob = make_lob()
         price = 5
         lob.on_limit(side, quantity=1, price=price, client_id="test_mid")
         lob.on_limit(
@@ -220,8 +262,8 @@ class TestOnLimit:
         assert best_q.qnext.limit == price - .02 * side
 
     @pytest.mark.parametrize("side", (Side.BID, Side.ASK))
-    def test_cross_bid_ask(self, side, instrument):
-        lob = Orderbook(instrument=instrument, send_private=send_private)
+    def test_cross_bid_ask(self, side, make_lob):
+        lob = make_lob()
         price = 5
         lob.on_limit(side, quantity=1, price=price, client_id="test_mid")
         lob.on_limit(side, quantity=1, price=price - .01 * side, client_id="test_mid")
@@ -239,9 +281,9 @@ class TestOnLimit:
         ],
     )
     def test_new_other_best(
-        self, side, quantity, s_price, o_price, l_price, n, instrument
+        self, side, quantity, s_price, o_price, l_price, n, make_lob
     ):
-        lob = Orderbook(instrument=instrument, send_private=send_private)
+        lob = make_lob()
         for i in range(n):
             lob.on_limit(side, quantity=1, price=s_price, client_id="test_mid")
             lob.on_limit(
@@ -259,12 +301,31 @@ class TestOnLimit:
         assert opposite_q.limit == o_price
         assert opposite_q.volume == quantity - 1
 
+    @pytest.mark.parametrize(
+        "side, o_price, prices",
+        [
+            [Side.BID, 60, [50, 10, 40, 25, 49.999, 10.001]],
+            [Side.ASK, 40, [50, 90, 60, 75, 50.001, 89.999]],
+        ],
+    )
+    def test_sparse_inserts(self, side, o_price, prices, make_lob):
+        lob = make_lob()
+        lob.on_limit(-side, quantity=1, price=o_price, client_id="test_mid")
+        for price in prices:
+            lob.on_limit(side, quantity=1, price=price, client_id="test_mid")
+        limits = []
+        q = lob.best_queue[side]
+        while q is not None:
+            limits.append(q.limit)
+            q = q.qnext
+        assert limits == sorted(prices, reverse=side.is_bid)
+
 
 @pytest.mark.parametrize("side", (Side.ASK, Side.BID))
 class TestOnCancel:
 
-    def test_when_single_order(self, instrument, side):
-        lob = Orderbook(instrument=instrument, send_private=send_private)
+    def test_when_single_order(self, make_lob, side):
+        lob = make_lob()
         lob.on_limit(side, quantity=1, price=3.002, client_id="test_mid")
         order_id = list(lob.order_map.keys())[0]
         order = lob.order_map.get(order_id)
@@ -276,15 +337,13 @@ class TestOnCancel:
         assert lob.best_queue[side] is None
         self.last_cancelled = order
 
-    def test_when_middle_order(self, side, instrument):
-        lob = Orderbook(instrument=instrument, send_private=send_private)
+    def test_when_middle_order(self, side, make_lob):
+        lob = make_lob()
         for i in range(1, 4):
             lob.on_limit(side, quantity=i, price=3.002, client_id="test_mid")
 
         # Cancel middle
-        order_id = next(
-            o.order_id for o in lob.order_map.values() if o.quantity == 2
-        )
+        order_id = find_order(lob, 2)
         order = lob.order_map.get(order_id)
         assert order.onext.quantity == 3
         assert order.oprev.quantity == 1
@@ -294,18 +353,14 @@ class TestOnCancel:
         assert lob.best_queue[side].nb_orders == 2
         self.last_cancelled = order
 
-    def test_when_head_order(self, side, instrument):
-        lob = Orderbook(instrument=instrument, send_private=send_private)
+    def test_when_head_order(self, side, make_lob):
+        lob = make_lob()
         lob.on_limit(side, quantity=1, price=3.002, client_id="test_mid")
         lob.on_limit(side, quantity=2, price=3.002, client_id="test_mid")
-        head_id = next(
-            o.order_id for o in lob.order_map.values() if o.quantity == 1
-        )
+        head_id = find_order(lob, 1)
         # Cancel Head
         order = lob.order_map[head_id]
-        tail_id = next(
-            o.order_id for o in lob.order_map.values() if o.quantity == 2
-        )
+        tail_id = find_order(lob, 2)
         tail = lob.order_map[tail_id]
         assert order.oprev is None
         assert order.onext == tail
@@ -314,17 +369,13 @@ class TestOnCancel:
         assert lob.best_queue[side].volume == 2
         assert lob.best_queue[side].nb_orders == 1
 
-    def test_when_tail_order(self, side, instrument):
-        lob = Orderbook(instrument=instrument, send_private=send_private)
+    def test_when_tail_order(self, side, make_lob):
+        lob = make_lob()
         lob.on_limit(side, quantity=1, price=3.002, client_id="test_mid")
         lob.on_limit(side, quantity=2, price=3.002, client_id="test_mid")
-        head_id = next(
-            o.order_id for o in lob.order_map.values() if o.quantity == 1
-        )
+        head_id = find_order(lob, 1)
         order = lob.order_map[head_id]
-        tail_id = next(
-            o.order_id for o in lob.order_map.values() if o.quantity == 2
-        )
+        tail_id = find_order(lob, 2)
         tail = lob.order_map[tail_id]
         assert tail.oprev == order
         assert tail.onext is None
@@ -339,21 +390,23 @@ class TestOnCancel:
 @pytest.mark.parametrize("side", (Side.BID, Side.ASK))
 class TestOnMarket:
 
-    def test_consume_all_liquidity_1Q(self, side, instrument):
-        lob = Orderbook(instrument=instrument, send_private=send_private)
+    def test_consume_all_liquidity_1Q(self, side, make_lob):
+        lob = make_lob()
         lob.on_limit(side, quantity=10, price=3.002, client_id="test_mid")
         lob.on_market(side, quantity=10, client_id="test_mid")
         assert lob.best_queue[side] is None
         assert lob.best_queue[-side] is None
 
-    def test_consume_portion_of_liquidity_1Q(self, side, instrument):
-        lob = Orderbook(instrument=instrument, send_private=send_private)
+    def test_consume_portion_of_liquidity_1Q(self, side, make_lob):
+        lob = make_lob()
         lob.on_limit(side, quantity=10, price=3.002, client_id="test_mid")
         lob.on_market(side, quantity=5, client_id="test_mid")
         assert lob.best_queue[side].volume == 5
 
-    def test_consume_portfion_of_liquidity_nQ(self, side, instrument):
-        lob = Orderbook(instrument=instrument, send_private=send_private)
+    def test_consume_portfion_of_liquidity_nQ(
+        self, side, instrument, make_lob
+    ):
+        lob = make_lob()
         tick = side * 0.001
         price = instrument.adjust_price(3.002 - tick)
         lob.on_limit(side=side, quantity=10, price=3.002, client_id="test_mid")
@@ -368,8 +421,8 @@ class TestOnMarket:
         assert lob.best_queue[side].limit == price
         assert lob.best_queue[side].volume == 15
 
-    def test_consume_all_liquidity_nQ(self, side, instrument):
-        lob = Orderbook(instrument=instrument, send_private=send_private)
+    def test_consume_all_liquidity_nQ(self, side, instrument, make_lob):
+        lob = make_lob()
         lob.on_limit(side, quantity=10, price=3.003, client_id="test_mid")
         tick = side * 0.001
         price = instrument.adjust_price(3.002 - tick)
@@ -379,33 +432,117 @@ class TestOnMarket:
             price=price,
             client_id="test_mid",
         )
-        lob = Orderbook(instrument=instrument, send_private=send_private)
+        lob = make_lob()
         lob.on_market(side, quantity=30, client_id="test_mid")
         assert lob.best_queue[side] is None
 
-    def test_exceed_available_liquidity(self, side, instrument):
-        lob = Orderbook(instrument=instrument, send_private=send_private)
+    def test_exceed_available_liquidity(self, side, make_lob):
+        lob = make_lob()
         lob.on_limit(side, quantity=10, price=3, client_id="test_mid")
         lob.on_market(side, quantity=15, client_id="test_mid")
         assert lob.best_queue[side].volume == 10
         # We are supposed to get a rejection message for the remaining quantity
 
 
+class TestInitState:
+
+    def test_levels(self, make_lob):
+        lob = make_lob()
+        bid_state = [(3.1, 30), (3.0, 10)]
+        ask_state = [(3.5, 20), (3.9, 25)]
+        lob.init_state(5, bid_state=bid_state, ask_state=ask_state)
+        assert len(lob.order_map) == 17
+        assert lob.best_volumes[Side.BID] == 40
+        assert lob.best_volumes[Side.ASK] == 45
+        for side, state in ((Side.BID, bid_state), (Side.ASK, ask_state)):
+            q = lob.best_queue[side]
+            for price, volume in state:
+                assert q.limit == price
+                assert q.volume == volume
+                assert q.nb_orders == volume // 5
+                order, n = q.ohead, 0
+                while order is not None:
+                    assert order.queue is q
+                    n += 1
+                    order = order.onext
+                assert n == q.nb_orders
+                q = q.qnext
+            assert q is None
+
+    def test_consume_seeded_orders(self, make_lob):
+        lob = make_lob()
+        lob.init_state(5, bid_state=[(3.1, 15)], ask_state=[])
+        lob.on_cancel(lob.best_queue[Side.BID].otail.order_id)
+        lob.on_market(Side.BID, quantity=7, client_id="test_mid")
+        assert len(lob.order_map) == 1
+        assert lob.best_queue[Side.BID].volume == 3
+        assert lob.best_volumes[Side.BID] == 3
+
+
+@pytest.mark.parametrize("depth", (None, 0, 1, 2, 5))
+def test_get_state_depth(depth, make_lob):
+    lob = make_lob()
+    bids = [(3.1, 5), (3.0, 10), (2.9, 15)]
+    asks = [(3.5, 20)]
+    lob.init_state(5, bid_state=bids, ask_state=asks)
+    state = lob.get_state(depth)
+    assert state["b"] == bids[:depth]
+    assert state["a"] == asks[:depth]
+
+
+def test_version(make_lob):
+    lob = make_lob()
+    lob.on_limit(Side.BID, 10, 3.1, client_id="test_version")
+    version = lob.version
+    lob.get_state()
+    str(lob)
+    assert lob.version == version
+    order_id = next(iter(lob.order_map))
+    lob.on_cancel(order_id)
+    assert lob.version > version
+
+
+def test_reset(make_lob):
+    lob = make_lob()
+    lob.init_state(5, bid_state=[(3.1, 5), (3.0, 10)], ask_state=[(3.5, 5)])
+    version = lob.version
+    lob.reset()
+    assert lob.version > version
+    assert not lob.queues and not lob.order_map
+    assert lob.best_queue == {Side.BID: None, Side.ASK: None}
+    assert lob.best_volumes == {Side.BID: 0, Side.ASK: 0}
+    assert lob.mid_price is None
+    lob.on_limit(Side.BID, 10, 3.1, client_id="test_reset")
+    lob.on_market(Side.BID, 10, client_id="test_reset")
+    assert lob.best_volumes[Side.BID] == 0
+
+
+def test_hashable(make_lob):
+    lob = make_lob()
+    lob.init_state(5, bid_state=[(3.1, 5), (3.0, 10)], ask_state=[(3.5, 5)])
+    queues = set(lob.queues.values())
+    assert lob.best_queue[Side.BID] in queues
+    assert len(queues) == 3
+    assert len(set(lob.order_map.values())) == len(lob.order_map)
+
+
 class TestOnAmend:
 
     @pytest.fixture(autouse=True)
-    def init(self, instrument):
-        self.lob = Orderbook(instrument=instrument, send_private=send_private)
+    def init(self, make_lob):
+        self.lob = make_lob()
         bid_data = [[5, 3.1], [10, 3.1], [15, 3.1], [4, 3], [6, 3]]
         ask_data = [[11, 3.5], [9, 3.5], [8, 3.9], [12, 3.9], [20, 3.9]]
         for i in range(5):
             self.lob.on_limit(Side.BID, *bid_data[i], client_id="test_mid")
             self.lob.on_limit(Side.ASK, *ask_data[i], client_id="test_mid")
+        # the quantities are all different
+        self.by_qty = {
+            o.quantity: o.order_id for o in self.lob.order_map.values()
+        }
 
     def amend_quantity(self):
-        order_id = next(
-            o.order_id for o in self.lob.order_map.values() if o.quantity == 8
-        )
+        order_id = self.by_qty[8]
         order = self.lob.order_map.get(order_id)
         self.lob.on_amend(order_id, quantity=3, price=order.price)
         assert order.queue.volume == 35
@@ -418,9 +555,7 @@ class TestOnAmend:
         assert order.queue.volume == 23
 
     def amend_quantity_and_limit(self):
-        order_id = next(
-            o.order_id for o in self.lob.order_map.values() if o.quantity == 20
-        )
+        order_id = self.by_qty[20]
         order = self.lob.order_map.get(order_id)
         q = order.queue
         self.lob.on_amend(order_id, quantity=5, price=3.5)
@@ -431,9 +566,7 @@ class TestOnAmend:
         assert order.queue.nb_orders == 4
 
     def amend_to_marketable(self):
-        order_id = next(
-            o.order_id for o in self.lob.order_map.values() if o.quantity == 12
-        )
+        order_id = self.by_qty[12]
         order = self.lob.order_map.get(order_id)
         q = order.queue
         self.lob.on_amend(order_id, quantity=12, price=2)
@@ -0,0 +1,40 @@
+import pytest
+from lobsim.utils import is_divisible
+
+
+@pytest.mark.parametrize(
+    "x, y",
+    (
+        (0.3, 0.1),
+        (2.002, 0.001),
+        (1.15, 0.05),
+        (2279791.5, 0.25),
+        (2360826.0, 1),
+        (123456.789, 0.001),
+        (0.0, 0.1),
+    ),
+)
+def test_on_grid(x, y):
+    assert is_divisible(x, y)
+
+
+@pytest.mark.parametrize(
+    "x, y",
+    (
+        (0.35, 0.1),
+        (2.0025, 0.001),
+        (1.00000001, 1),
+        (2360826.00000001, 1),
+        (2279791.5000001, 0.25),
+        (123456.7891, 0.001),
+        (1.0, 0),
+    ),
+)
+def test_off_grid(x, y):
+    assert not is_divisible(x, y)
+
+
+def test_representation_error():
+    # offsets below 1e-9 are taken for float representation errors
+    assert is_divisible(0.1 + 0.2, 0.1)
+    assert is_divisible(1.0000000001, 1)